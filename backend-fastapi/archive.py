@@ -0,0 +1,106 @@
+"""
+Hot/cold tiering for appointments and prescriptions.
+
+Old documents are moved in batches from the live collections into
+*_archive collections, so the working set and index size of the hot tier stay
+flat as the platform ages. List endpoints read the hot tier only unless
+include_archive=true is passed.
+
+    python archive.py                       # use the configured ages
+    python archive.py --appointments-days 30 --batch-size 500 --dry-run
+"""
+import os
+import time
+import argparse
+from datetime import datetime, timedelta
+
+import pytz
+from pymongo import ReplaceOne
+
+from db import appointments_col, prescriptions_col, appointments_archive_col, prescriptions_archive_col
+
+ARCHIVE_APPOINTMENTS_AFTER_DAYS = int(os.getenv("ARCHIVE_APPOINTMENTS_AFTER_DAYS", "90"))
+ARCHIVE_PRESCRIPTIONS_AFTER_DAYS = int(os.getenv("ARCHIVE_PRESCRIPTIONS_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# Pause between batches so the job doesn't starve live traffic
+ARCHIVE_BATCH_PAUSE_SECONDS = float(os.getenv("ARCHIVE_BATCH_PAUSE_SECONDS", "0.1"))
+
+
+def move_batch(source, target, query: dict, batch_size: int) -> int:
+    docs = list(source.find(query).sort("_id", 1).limit(batch_size))
+    if not docs:
+        return 0
+
+    # Upsert by _id: a batch interrupted between the copy and the delete is simply redone
+    target.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs], ordered=False)
+    source.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+    return len(docs)
+
+
+def archive(source, target, query: dict, batch_size: int = ARCHIVE_BATCH_SIZE,
+            pause: float = ARCHIVE_BATCH_PAUSE_SECONDS, dry_run: bool = False) -> int:
+    if dry_run:
+        return source.count_documents(query)
+
+    total = 0
+    while True:
+        moved = move_batch(source, target, query, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+        time.sleep(pause)
+
+
+def appointments_query(days: int) -> dict:
+    # Any appointment whose slot is that far in the past is done, whatever its status
+    cutoff = datetime.now(pytz.utc) - timedelta(days=days)
+    return {"slot": {"$lt": cutoff}}
+
+
+def prescriptions_query(days: int) -> dict:
+    cutoff = datetime.now(pytz.utc) - timedelta(days=days)
+    return {"createdAt": {"$lt": cutoff}}
+
+
+def tiered_find(hot, cold, include_archive: bool, query: dict, projection: dict = None,
+                sort: tuple = None, session=None) -> list:
+    """
+    find() over the hot tier, optionally followed by the archive.
+    Archived documents are always older than hot ones on the field the tiers are cut on,
+    so a sort on that field is kept by putting the archive after (desc) or before (asc).
+    """
+    def fetch(col):
+        cursor = col.find(query, projection, session=session)
+        if sort:
+            cursor = cursor.sort(*sort)
+        return list(cursor)
+
+    docs = fetch(hot)
+    if not include_archive:
+        return docs
+
+    archived = fetch(cold)
+    if sort and sort[1] > 0:
+        return archived + docs
+    return docs + archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--appointments-days", type=int, default=ARCHIVE_APPOINTMENTS_AFTER_DAYS)
+    parser.add_argument("--prescriptions-days", type=int, default=ARCHIVE_PRESCRIPTIONS_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be moved")
+    args = parser.parse_args()
+
+    moved = archive(appointments_col, appointments_archive_col, appointments_query(args.appointments_days),
+                    args.batch_size, dry_run=args.dry_run)
+    print(f"appointments:  {moved} {'to archive' if args.dry_run else 'archived'}")
+
+    moved = archive(prescriptions_col, prescriptions_archive_col, prescriptions_query(args.prescriptions_days),
+                    args.batch_size, dry_run=args.dry_run)
+    print(f"prescriptions: {moved} {'to archive' if args.dry_run else 'archived'}")
+
+
+if __name__ == "__main__":
+    main()
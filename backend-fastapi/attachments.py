@@ -0,0 +1,207 @@
+"""
+Content-addressed storage for prescription attachments (scans, PDFs).
+
+Files are stored once per SHA-256 of their bytes, whichever record or patient
+uploads them; prescriptions only hold {sha256, filename, contentType, size}.
+Uploads are written chunk by chunk while the hash is computed, so no file is
+ever held whole in memory.
+
+    ATTACHMENT_BACKEND=disk     # disk: ATTACHMENT_DIR/ab/cd/<sha256> | gridfs: "attachments" bucket
+    ATTACHMENT_DIR=./uploads
+    ATTACHMENT_MAX_MB=25
+
+Disk downloads are FileResponses: Range requests are answered from the file, and
+ASGI servers with the pathsend extension send it with sendfile(). GridFS downloads
+stream chunk by chunk from the requested offset.
+"""
+import os
+import re
+import uuid
+import hashlib
+import tempfile
+
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+
+from db import get_db
+
+ATTACHMENT_BACKEND = os.getenv("ATTACHMENT_BACKEND", "disk")
+ATTACHMENT_DIR = os.getenv("ATTACHMENT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads"))
+ATTACHMENT_MAX_BYTES = int(float(os.getenv("ATTACHMENT_MAX_MB", "25")) * 1024 * 1024)
+ATTACHMENT_TYPES = frozenset(
+    t.strip() for t in os.getenv(
+        "ATTACHMENT_TYPES", "application/pdf,image/png,image/jpeg,image/webp,application/dicom"
+    ).split(",") if t.strip()
+)
+
+# Upload bytes are handed to the storage thread in pieces of this size
+WRITE_BUFFER_BYTES = 1024 * 1024
+GRIDFS_CHUNK_BYTES = 255 * 1024
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+if ATTACHMENT_BACKEND not in ("disk", "gridfs"):
+    raise ValueError(f"ATTACHMENT_BACKEND must be disk or gridfs, got {ATTACHMENT_BACKEND!r}")
+
+
+def clean_filename(name) -> str:
+    """A display name safe for Content-Disposition: no path, quotes or control characters"""
+    name = os.path.basename(str(name or "").replace("\\", "/"))
+    name = re.sub(r"[^A-Za-z0-9._ -]", "_", name).strip(" .")[:120]
+    return name or "attachment"
+
+
+def _cache_headers(sha256: str) -> dict:
+    # Content addressed: the bytes behind a hash never change
+    return {"ETag": f'"{sha256}"', "Cache-Control": "private, max-age=31536000, immutable"}
+
+
+def _single_range(header, size: int):
+    """(start, end inclusive) of a single "bytes=" range, None to send everything"""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None  # ignoring a Range header is always allowed
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # bytes=-N: the last N bytes
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(416, headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+
+##------------------- Disk -------------------##
+
+class _DiskWriter:
+    def __init__(self, storage: "DiskStorage"):
+        self.storage = storage
+        tmp_dir = os.path.join(storage.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes):
+        self.file.write(data)
+        self.hasher.update(data)
+        self.size += len(data)
+
+    def commit(self):
+        """Returns (sha256, size, already_stored)"""
+        self.file.close()
+        sha256 = self.hasher.hexdigest()
+        final = self.storage.path(sha256)
+        if os.path.exists(final):
+            os.unlink(self.file.name)
+            return sha256, self.size, True
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        # Atomic: a concurrent upload of the same bytes just replaces identical content
+        os.replace(self.file.name, final)
+        return sha256, self.size, False
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.unlink(self.file.name)
+        except FileNotFoundError:
+            pass
+
+
+class DiskStorage:
+    def __init__(self, root: str = ATTACHMENT_DIR):
+        self.root = root
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def writer(self) -> _DiskWriter:
+        return _DiskWriter(self)
+
+    def response(self, sha256: str, content_type: str, filename: str, range_header=None):
+        path = self.path(sha256)
+        if not os.path.exists(path):
+            raise HTTPException(404, "Attachment content missing")
+        # FileResponse reads the Range header from the request itself
+        return FileResponse(path, media_type=content_type, filename=filename,
+                            content_disposition_type="inline", headers=_cache_headers(sha256))
+
+
+##------------------- GridFS -------------------##
+
+class _GridFSWriter:
+    def __init__(self, bucket: GridFSBucket):
+        self.bucket = bucket
+        # Renamed to the hash once it is known
+        self.stream = bucket.open_upload_stream(f"tmp-{uuid.uuid4().hex}", chunk_size_bytes=GRIDFS_CHUNK_BYTES)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes):
+        self.stream.write(data)
+        self.hasher.update(data)
+        self.size += len(data)
+
+    def commit(self):
+        self.stream.close()
+        sha256 = self.hasher.hexdigest()
+        existing = get_db()["attachments.files"].find_one({"filename": sha256}, {"_id": 1})
+        if existing is not None:
+            self.bucket.delete(self.stream._id)
+            return sha256, self.size, True
+        self.bucket.rename(self.stream._id, sha256)
+        return sha256, self.size, False
+
+    def abort(self):
+        self.stream.abort()
+
+
+class GridFSStorage:
+    def _bucket(self) -> GridFSBucket:
+        # Built per call: the client behind get_db() is per process
+        return GridFSBucket(get_db(), bucket_name="attachments")
+
+    def writer(self) -> _GridFSWriter:
+        return _GridFSWriter(self._bucket())
+
+    def response(self, sha256: str, content_type: str, filename: str, range_header=None):
+        try:
+            grid_out = self._bucket().open_download_stream_by_name(sha256)
+        except NoFile:
+            raise HTTPException(404, "Attachment content missing")
+
+        size = grid_out.length
+        headers = {**_cache_headers(sha256), "Accept-Ranges": "bytes",
+                   "Content-Disposition": f'inline; filename="{filename}"'}
+        status_code = 200
+        start, end = 0, size - 1
+        byte_range = _single_range(range_header, size) if size else None
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1 if size else 0)
+
+        def chunks():
+            # Sync generator: Starlette iterates it in the threadpool
+            try:
+                grid_out.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    data = grid_out.read(min(GRIDFS_CHUNK_BYTES, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+            finally:
+                grid_out.close()
+
+        return StreamingResponse(chunks(), status_code=status_code, media_type=content_type, headers=headers)
+
+
+storage = DiskStorage() if ATTACHMENT_BACKEND == "disk" else GridFSStorage()
@@ -1,9 +1,12 @@
 import os
+import time
+import uuid
 from datetime import datetime, timedelta
 from jose import jwt
 from dotenv import load_dotenv
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
+from profiling import record
 
 load_dotenv()
 
@@ -14,17 +17,38 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 480
 ph = PasswordHasher()  # Argon2id (secure, no 72-byte limit)
 
 def hash_password(password: str):
-    return ph.hash(password)
+    start = time.perf_counter()
+    try:
+        return ph.hash(password)
+    finally:
+        record("argon2", time.perf_counter() - start)
 
 def verify_password(password: str, hashed: str):
+    start = time.perf_counter()
     try:
         ph.verify(hashed, password)
         return True
     except VerifyMismatchError:
         return False
+    finally:
+        record("argon2", time.perf_counter() - start)
+
+def token_claims(user: dict, role: str = None) -> dict:
+    """
+    Claims for a user document. The scope claims (hospital_id, wallet_address) let guards
+    authorize without reading the user back; mint a new token whenever one of them changes.
+    """
+    return {
+        "user_id": str(user["_id"]),
+        "role": role or user["role"],
+        "name": user["name"],
+        "hospital_id": user.get("hospitalId"),
+        "wallet_address": user.get("wallet_address"),
+    }
 
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # iat and jti let revocation.py invalidate tokens before they expire
+    to_encode.update({"exp": expire, "iat": time.time(), "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
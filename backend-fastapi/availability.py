@@ -0,0 +1,168 @@
+import os
+import time
+import heapq
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+import pytz
+
+from db import appointments_col
+
+IST = pytz.timezone("Asia/Kolkata")
+
+SLOT_MINUTES = int(os.getenv("SLOT_MINUTES", "30"))
+CLINIC_OPEN_HOUR = int(os.getenv("CLINIC_OPEN_HOUR", "9"))
+CLINIC_CLOSE_HOUR = int(os.getenv("CLINIC_CLOSE_HOUR", "17"))
+AVAILABILITY_HORIZON_DAYS = int(os.getenv("AVAILABILITY_HORIZON_DAYS", "14"))
+# Other workers book too; the whole index is rebuilt from Mongo this often
+AVAILABILITY_REFRESH_SECONDS = float(os.getenv("AVAILABILITY_REFRESH_SECONDS", "300"))
+
+SLOT_SECONDS = SLOT_MINUTES * 60
+ACTIVE_STATUSES = ["REQUESTED", "ACCEPTED"]
+
+
+def to_epoch(slot: datetime) -> int:
+    # Mongo hands back naive datetimes that are UTC
+    if slot.tzinfo is None:
+        slot = pytz.utc.localize(slot)
+    return int(slot.timestamp())
+
+
+class DoctorSchedule:
+    """Sorted start times (epoch seconds) of one doctor's booked slots, each SLOT_SECONDS long"""
+
+    __slots__ = ("starts",)
+
+    def __init__(self):
+        self.starts = []
+
+    def add(self, start: int):
+        i = bisect_left(self.starts, start)
+        if i == len(self.starts) or self.starts[i] != start:
+            self.starts.insert(i, start)
+
+    def remove(self, start: int):
+        i = bisect_left(self.starts, start)
+        if i < len(self.starts) and self.starts[i] == start:
+            del self.starts[i]
+
+    def is_free(self, start: int) -> bool:
+        # Every interval has the same length, so only a booking starting within
+        # (start - SLOT, start + SLOT) can overlap [start, start + SLOT)
+        i = bisect_left(self.starts, start - SLOT_SECONDS + 1)
+        return i == len(self.starts) or self.starts[i] >= start + SLOT_SECONDS
+
+
+def clinic_slots(after: int, until: int):
+    """Slot grid start times within clinic hours (IST), from `after` up to `until`"""
+    day = datetime.fromtimestamp(after, IST).date()
+    last_day = datetime.fromtimestamp(until, IST).date()
+
+    while day <= last_day:
+        opening = IST.localize(datetime(day.year, day.month, day.day, CLINIC_OPEN_HOUR))
+        closing = IST.localize(datetime(day.year, day.month, day.day, CLINIC_CLOSE_HOUR))
+        start = int(opening.timestamp())
+        end = min(int(closing.timestamp()), until)
+
+        if start < after:
+            # First grid point at or after `after`
+            start += -(-(after - start) // SLOT_SECONDS) * SLOT_SECONDS
+
+        while start + SLOT_SECONDS <= end:
+            yield start
+            start += SLOT_SECONDS
+        day += timedelta(days=1)
+
+
+def _free_slots(schedule: DoctorSchedule, doctor_id: str, after: int, until: int):
+    for slot in clinic_slots(after, until):
+        if schedule.is_free(slot):
+            yield slot, doctor_id
+
+
+class AvailabilityIndex:
+    """
+    In-memory interval index of booked slots per doctor.
+    Built from one scan of future active appointments, then kept current by the
+    booking routes. Free-slot searches never touch the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._schedules = {}  # doctorId (str) -> DoctorSchedule
+        self._built_at = None
+        # (method, doctorId, start) of book/release calls made while a rebuild scans Mongo,
+        # replayed onto the new schedules; None when no rebuild is running
+        self._changes = None
+
+    def _ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > AVAILABILITY_REFRESH_SECONDS:
+            with self._rebuild_lock:
+                # Another thread may have rebuilt while we waited
+                if self._built_at is None or time.monotonic() - self._built_at > AVAILABILITY_REFRESH_SECONDS:
+                    self.rebuild()
+
+    def rebuild(self):
+        """Called under _rebuild_lock (see _ensure_fresh)"""
+        with self._lock:
+            self._changes = []
+
+        try:
+            now = datetime.now(pytz.utc)
+            schedules = {}
+            cursor = appointments_col.find(
+                {"slot": {"$gte": now - timedelta(seconds=SLOT_SECONDS)}, "status": {"$in": ACTIVE_STATUSES}},
+                {"doctorId": 1, "slot": 1, "_id": 0}
+            )
+            for apt in cursor:
+                schedules.setdefault(str(apt["doctorId"]), DoctorSchedule()).add(to_epoch(apt["slot"]))
+
+            with self._lock:
+                # The scan may or may not have seen these; both are idempotent, so replaying is safe
+                for method, doctor_id, start in self._changes:
+                    getattr(schedules.setdefault(doctor_id, DoctorSchedule()), method)(start)
+                self._schedules = schedules
+                self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._changes = None
+
+    def _apply(self, method: str, doctor_id, slot: datetime):
+        doctor_id, start = str(doctor_id), to_epoch(slot)
+        with self._lock:
+            getattr(self._schedules.setdefault(doctor_id, DoctorSchedule()), method)(start)
+            if self._changes is not None:
+                self._changes.append((method, doctor_id, start))
+
+    def book(self, doctor_id, slot: datetime):
+        self._apply("add", doctor_id, slot)
+
+    def release(self, doctor_id, slot: datetime):
+        self._apply("remove", doctor_id, slot)
+
+    def earliest_free(self, doctor_ids, limit: int, after: datetime = None):
+        """Earliest `limit` free (slot, doctorId) pairs across the given doctors"""
+        self._ensure_fresh()
+
+        # The index only holds bookings from now on: past slots would all look free
+        start = max(int(time.time()), to_epoch(after)) if after else int(time.time())
+        until = start + AVAILABILITY_HORIZON_DAYS * 86400
+
+        with self._lock:
+            empty = DoctorSchedule()
+            streams = [
+                _free_slots(self._schedules.get(doctor_id, empty), doctor_id, start, until)
+                for doctor_id in map(str, doctor_ids)
+            ]
+            # k-way merge of per-doctor streams, stops after `limit` items
+            result = []
+            for slot, doctor_id in heapq.merge(*streams):
+                result.append((datetime.fromtimestamp(slot, pytz.utc), doctor_id))
+                if len(result) >= limit:
+                    break
+        return result
+
+
+availability_index = AvailabilityIndex()
@@ -0,0 +1,164 @@
+"""
+Microbenchmarks of the blockchain path on an in-process chain (local_chain.py).
+
+    python -m bench.chain_bench --patients 200 --logs 500 --concurrency 8 --output bench/chain_baseline.json
+
+  check_access   latency of single checkAccess calls and of checkAccessBatch over all patients
+  log_access     throughput of logDataAccess sent one by one, then through the access-log
+                 queue fed by --concurrency request threads (the path the routes use)
+  indexing       LogAccess events fetched with get_logs in --block-range chunks and indexed
+                 per patient, in events per second
+
+Numbers are for py-evm, not a real node: use them to compare revisions of the client,
+not to predict production latency. Needs: pip install "eth-tester[py-evm]"
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_chain import eth_tester_client, new_account, grant_access
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=100)
+    parser.add_argument("--checks", type=int, default=1000, help="Single check_access calls to time")
+    parser.add_argument("--logs", type=int, default=300, help="logDataAccess transactions per phase")
+    parser.add_argument("--concurrency", type=int, default=8, help="Threads submitting to the access-log queue")
+    parser.add_argument("--block-range", type=int, default=100, help="Blocks per get_logs call when indexing")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here")
+    return parser.parse_args()
+
+
+def percentiles(samples: list) -> dict:
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+    }
+
+
+def setup(client, args, rng):
+    doctor = new_account(client)
+    patients = [new_account(client) for _ in range(args.patients)]
+    # Half of the patients grant access, so both answers are exercised
+    for patient in patients:
+        if rng.random() < 0.5:
+            grant_access(client, patient, doctor.address)
+    return doctor, [p.address for p in patients]
+
+
+def bench_check_access(client, doctor, patients, args, rng) -> dict:
+    samples = []
+    for _ in range(args.checks):
+        patient = rng.choice(patients)
+        start = time.perf_counter()
+        client.check_access(patient, doctor.address)
+        samples.append(time.perf_counter() - start)
+
+    batch = []
+    for _ in range(20):
+        start = time.perf_counter()
+        client.check_access_batch(patients, doctor.address)
+        batch.append(time.perf_counter() - start)
+
+    return {"single": percentiles(samples), f"batch_of_{len(patients)}": percentiles(batch)}
+
+
+def bench_log_access(client, doctor, patients, args, rng) -> dict:
+    start = time.perf_counter()
+    for i in range(args.logs):
+        client.log_access(rng.choice(patients), doctor.address, f"bench-sequential-{i}")
+    sequential = args.logs / (time.perf_counter() - start)
+
+    # Request threads only enqueue; the single worker sends (and owns the nonce)
+    per_thread = args.logs // args.concurrency
+    enqueue = []
+    lock = threading.Lock()
+
+    def submitter(n):
+        local_rng = random.Random(args.seed + n)
+        for i in range(per_thread):
+            t0 = time.perf_counter()
+            client.submit_access_log(local_rng.choice(patients), doctor.address, f"bench-queued-{n}-{i}")
+            with lock:
+                enqueue.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=submitter, args=(n,)) for n in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    client._log_queue.join()
+    queued = per_thread * args.concurrency / (time.perf_counter() - start)
+
+    return {
+        "sequential_tx_per_s": round(sequential, 1),
+        "queued_tx_per_s": round(queued, 1),
+        "enqueue": percentiles(enqueue),
+    }
+
+
+def bench_indexing(client, args) -> dict:
+    latest = client.w3.eth.block_number
+    index = {}  # patient -> [(block, resource)]
+    events = 0
+
+    start = time.perf_counter()
+    for from_block in range(0, latest + 1, args.block_range):
+        to_block = min(latest, from_block + args.block_range - 1)
+        for event in client.contract.events.LogAccess.get_logs(from_block=from_block, to_block=to_block):
+            index.setdefault(event["args"]["patient"], []).append((event["blockNumber"], event["args"]["resourceId"]))
+            events += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "blocks": latest + 1,
+        "events": events,
+        "patients_indexed": len(index),
+        "seconds": round(elapsed, 3),
+        "events_per_s": round(events / elapsed, 1) if elapsed else None,
+    }
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    client = eth_tester_client()
+    doctor, patients = setup(client, args, rng)
+
+    report = {
+        "python": platform.python_version(),
+        "args": vars(args),
+        "check_access": bench_check_access(client, doctor, patients, args, rng),
+        "log_access": bench_log_access(client, doctor, patients, args, rng),
+        "indexing": bench_indexing(client, args),
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
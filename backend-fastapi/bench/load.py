@@ -0,0 +1,225 @@
+"""
+Replay dashboard and booking traffic against a running backend and report latency.
+
+    python -m bench.load --base-url http://127.0.0.1:8000 --duration 60 --concurrency 32 --output bench/baseline.json
+    python -m bench.load ... --compare bench/baseline.json
+
+Tokens are minted locally with JWT_SECRET (the server must share it), so the replay
+does not pay for an Argon2 login per virtual user. Each virtual user picks a scenario
+by weight and runs its requests back to back. Results are grouped by route template.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import create_access_token
+
+SLOT_MINUTES = 30
+
+# Scenario -> weight; mirrors what the dashboards fire when they are opened
+SCENARIOS = {
+    "patient_dashboard": 45,
+    "doctor_dashboard": 30,
+    "booking_flow": 25,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--manifest", default=os.path.join(os.path.dirname(__file__), "seed_manifest.json"))
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of measured traffic")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of unmeasured traffic first")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed p95 regression (0.10 = 10%%)")
+    return parser.parse_args()
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # endpoint -> [latency seconds]
+        self.errors = {}
+        self.recording = False
+
+    def add(self, endpoint: str, seconds: float, ok: bool):
+        if not self.recording:
+            return
+        self.samples.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, manifest: dict, rng: random.Random, recorder: Recorder):
+        self.client = client
+        self.manifest = manifest
+        self.rng = rng
+        self.recorder = recorder
+
+    async def call(self, endpoint: str, method: str, url: str, token: str = None, ok_status=(200,), **kwargs):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+            ok = response.status_code in ok_status
+        except httpx.HTTPError:
+            ok = False
+        self.recorder.add(endpoint, time.perf_counter() - start, ok)
+
+    def patient_token(self):
+        patient_id = self.rng.choice(self.manifest["patients"])
+        return create_access_token({"user_id": patient_id, "role": "PATIENT", "name": "Bench Patient"})
+
+    async def patient_dashboard(self):
+        token = self.patient_token()
+        await self.call("GET /appointments/patient", "GET", "/appointments/patient", token)
+        await self.call("GET /prescriptions/patient", "GET", "/prescriptions/patient", token)
+        await self.call("GET /hospitals/", "GET", "/hospitals/")
+
+    async def doctor_dashboard(self):
+        doctor = self.rng.choice(self.manifest["doctors"])
+        token = create_access_token({"user_id": doctor["id"], "role": "DOCTOR", "name": "Bench Doctor"})
+        await self.call("GET /appointments/doctor/my-appointments", "GET", "/appointments/doctor/my-appointments", token)
+        await self.call("GET /prescriptions/doctor", "GET", "/prescriptions/doctor", token)
+
+    async def booking_flow(self):
+        token = self.patient_token()
+        doctor = self.rng.choice(self.manifest["doctors"])
+        hospital_id = doctor["hospitalId"]
+
+        await self.call("GET /hospitals/", "GET", "/hospitals/")
+        await self.call("GET /hospitals/{hospital_id}", "GET", f"/hospitals/{hospital_id}")
+        await self.call("GET /appointments/hospitals/{hospital_id}/doctors", "GET", f"/appointments/hospitals/{hospital_id}/doctors")
+
+        slot = datetime.now(timezone.utc) + timedelta(minutes=SLOT_MINUTES * self.rng.randint(2, 30 * 48))
+        slot = slot.replace(minute=(slot.minute // SLOT_MINUTES) * SLOT_MINUTES, second=0, microsecond=0)
+        await self.call(
+            "POST /appointments/request", "POST", "/appointments/request", token,
+            ok_status=(200, 409),  # a clash is a valid answer, not an error
+            json={"doctorId": doctor["id"], "hospitalId": hospital_id, "slot": slot.isoformat()},
+        )
+
+    async def run(self, stop_at: float):
+        names = list(SCENARIOS)
+        weights = [SCENARIOS[n] for n in names]
+        while time.perf_counter() < stop_at:
+            scenario = self.rng.choices(names, weights=weights)[0]
+            await getattr(self, scenario)()
+
+
+async def replay(args, manifest: dict) -> dict:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30.0) as client:
+        users = [VirtualUser(client, manifest, random.Random(args.seed + i), recorder) for i in range(args.concurrency)]
+
+        start = time.perf_counter()
+        stop_at = start + args.warmup + args.duration
+        tasks = [asyncio.create_task(u.run(stop_at)) for u in users]
+
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        measure_start = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - measure_start
+
+    endpoints = {}
+    for endpoint, values in sorted(recorder.samples.items()):
+        values.sort()
+        endpoints[endpoint] = {
+            "count": len(values),
+            "errors": recorder.errors.get(endpoint, 0),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        }
+
+    total = sum(e["count"] for e in endpoints.values())
+    return {
+        "meta": {
+            "startedAt": datetime.now(timezone.utc).isoformat(),
+            "baseUrl": args.base_url,
+            "duration_s": round(elapsed, 2),
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "scenarios": SCENARIOS,
+            "dataset": {"db": manifest["db"], "seed": manifest["seed"], "scale": manifest["scale"]},
+            "python": platform.python_version(),
+        },
+        "total": {"count": total, "throughput_rps": round(total / elapsed, 2)},
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: dict):
+    print(f"{'endpoint':<48} {'count':>8} {'err':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for endpoint, s in report["endpoints"].items():
+        print(f"{endpoint:<48} {s['count']:>8} {s['errors']:>5} {s['throughput_rps']:>8.1f} "
+              f"{s['p50_ms']:>7.1f}ms {s['p95_ms']:>7.1f}ms {s['p99_ms']:>7.1f}ms")
+    print(f"total: {report['total']['count']} requests, {report['total']['throughput_rps']} req/s")
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> bool:
+    """Print p95/p99 deltas against a baseline, return False on a regression past the threshold"""
+    if baseline["meta"].get("dataset") != report["meta"].get("dataset"):
+        print("WARNING: baseline was recorded on a different data set")
+
+    ok = True
+    print(f"\n{'endpoint':<48} {'p95 base':>10} {'p95 now':>10} {'delta':>8}")
+    for endpoint, now in report["endpoints"].items():
+        base = baseline["endpoints"].get(endpoint)
+        if not base or not base["p95_ms"]:
+            continue
+        delta = (now["p95_ms"] - base["p95_ms"]) / base["p95_ms"]
+        flag = ""
+        if delta > threshold:
+            flag, ok = "  REGRESSION", False
+        print(f"{endpoint:<48} {base['p95_ms']:>8.1f}ms {now['p95_ms']:>8.1f}ms {delta:>+7.1%}{flag}")
+    return ok
+
+
+def main():
+    args = parse_args()
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+
+    report = asyncio.run(replay(args, manifest))
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
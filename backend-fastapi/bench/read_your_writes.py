@@ -0,0 +1,102 @@
+"""
+Check read-your-writes with reads routed to secondaries (see consistency.py).
+
+    docker compose -f bench/replica_set/docker-compose.yml up -d
+    MONGO_URI="mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0" \
+        python -m bench.read_your_writes --iterations 2000
+
+Each iteration writes a probe document for a random user in that user's causal session,
+then reads it back from a secondary in a new session, the way the next request does:
+
+  same-worker   the read session is seeded from the worker's per-user times
+  cross-worker  the per-user times are dropped and the session is seeded by the
+                primary version lookup that conditional_get performs
+
+A control run reads from a secondary without a session and counts how often the
+write is not visible yet. Probe writes use w=1, so secondaries really can lag.
+The causal runs must see every write; the script exits non-zero otherwise.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+os.environ.setdefault("READ_PREFERENCE", "secondary")
+os.environ.setdefault("DB_NAME", "ehealth_bench")
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from pymongo import WriteConcern
+
+import consistency
+from consistency import causal_session, replica
+from db import get_db
+from versions import bump, get_versions, user_scope
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def run(mode: str, iterations: int, users: list, rng: random.Random) -> dict:
+    probes = get_db()["ryw_probe"].with_options(write_concern=WriteConcern(w=1))
+    misses = 0
+    start = time.perf_counter()
+
+    for _ in range(iterations):
+        user_id = rng.choice(users)
+        probe_id = ObjectId()
+
+        with causal_session(user_id) as session:
+            probes.insert_one({"_id": probe_id, "userId": user_id}, session=session)
+            bump(user_scope(user_id), session=session)
+
+        if mode == "control":
+            found = replica(probes).find_one({"_id": probe_id})
+        else:
+            if mode == "cross-worker":
+                consistency._last_seen.clear()
+            with causal_session(user_id) as session:
+                if mode == "cross-worker":
+                    get_versions(user_scope(user_id), session=session)
+                found = replica(probes).find_one({"_id": probe_id}, session=session)
+
+        if found is None:
+            misses += 1
+
+    return {"mode": mode, "iterations": iterations, "misses": misses, "seconds": round(time.perf_counter() - start, 2)}
+
+
+def main():
+    args = parse_args()
+    if not consistency.ROUTING_ENABLED:
+        sys.exit("READ_PREFERENCE=primary: nothing is routed to secondaries, set another mode")
+
+    hello = get_db().client.admin.command("hello")
+    if not hello.get("setName"):
+        sys.exit("MONGO_URI does not point at a replica set")
+
+    rng = random.Random(args.seed)
+    users = [str(ObjectId()) for _ in range(args.users)]
+
+    results = [run(mode, args.iterations, users, rng) for mode in ("control", "same-worker", "cross-worker")]
+    get_db()["ryw_probe"].drop()
+
+    print(f"{'mode':<14}{'iterations':>12}{'misses':>10}{'seconds':>10}")
+    for r in results:
+        print(f"{r['mode']:<14}{r['iterations']:>12}{r['misses']:>10}{r['seconds']:>10}")
+
+    if any(r["misses"] for r in results if r["mode"] != "control"):
+        print("FAIL: a causal read missed its own write")
+        sys.exit(1)
+    print("OK: every causal read saw its own write")
+
+
+if __name__ == "__main__":
+    main()
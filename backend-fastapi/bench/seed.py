@@ -0,0 +1,221 @@
+"""
+Seed a MongoDB database with synthetic platform data for load benchmarks.
+
+    python -m bench.seed --db ehealth_bench --patients 100000 --appointments 2000000
+
+Everything is generated from --seed, so two runs with the same arguments produce
+the same data set. Documents are streamed into insert_many batches, memory use
+does not grow with the scale. A manifest with sample ids is written for bench.load.
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+
+import pytz
+from bson import ObjectId
+from pymongo import MongoClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import hash_password
+
+IST = pytz.timezone("Asia/Kolkata")
+BENCH_PASSWORD = "bench-password"
+SLOT_MINUTES = 30
+
+SPECIALIZATIONS = ["General Physician", "Cardiology", "Dermatology", "Pediatrics", "Orthopedics", "Neurology", "ENT"]
+DIAGNOSES = ["Hypertension", "Type 2 Diabetes", "Migraine", "Asthma", "Viral Fever", "Gastritis", "Hypothyroidism", "Allergic Rhinitis"]
+MEDICINES = ["Metformin", "Amlodipine", "Paracetamol", "Cetirizine", "Pantoprazole", "Levothyroxine", "Salbutamol", "Azithromycin"]
+CITIES = [("Bengaluru", "Karnataka", 12.97, 77.59), ("Mumbai", "Maharashtra", 19.07, 72.87), ("Delhi", "Delhi", 28.61, 77.20),
+          ("Chennai", "Tamil Nadu", 13.08, 80.27), ("Hyderabad", "Telangana", 17.38, 78.48), ("Pune", "Maharashtra", 18.52, 73.85)]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="ehealth_bench", help="Database to seed (point the app at it with DB_NAME)")
+    parser.add_argument("--hospitals", type=int, default=50)
+    parser.add_argument("--doctors-per-hospital", type=int, default=20)
+    parser.add_argument("--patients", type=int, default=50000)
+    parser.add_argument("--appointments", type=int, default=1000000)
+    parser.add_argument("--prescriptions", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sample-size", type=int, default=500, help="Ids of each kind written to the manifest")
+    parser.add_argument("--manifest", default=os.path.join(os.path.dirname(__file__), "seed_manifest.json"))
+    parser.add_argument("--drop", action="store_true", help="Drop the target database first")
+    return parser.parse_args()
+
+
+def object_id(rng: random.Random) -> ObjectId:
+    # Deterministic ids: same seed, same ids, so manifests stay valid across re-seeds
+    return ObjectId(rng.getrandbits(96).to_bytes(12, "big"))
+
+
+def insert_batches(col, docs, batch_size: int) -> int:
+    batch, total = [], 0
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            col.insert_many(batch, ordered=False)
+            total += len(batch)
+            batch = []
+    if batch:
+        col.insert_many(batch, ordered=False)
+        total += len(batch)
+    return total
+
+
+def gen_hospitals(args, rng):
+    for i in range(args.hospitals):
+        city, state, lat, lng = CITIES[i % len(CITIES)]
+        yield {
+            "hospitalId": f"HOSP{i:05d}",
+            "hospitalName": f"Bench Hospital {i}",
+            "city": city,
+            "state": state,
+            "location": {"type": "Point", "coordinates": [lng + rng.uniform(-0.2, 0.2), lat + rng.uniform(-0.2, 0.2)]},
+        }
+
+
+def gen_doctors(args, rng, password_hash, doctor_ids):
+    for i, (doctor_id, hospital_id) in enumerate(doctor_ids):
+        yield {
+            "_id": doctor_id,
+            "name": f"Dr. Bench {i}",
+            "email": f"doctor{i}@bench.local",
+            "phone": f"9{i:09d}",
+            "passwordHash": password_hash,
+            "role": "DOCTOR",
+            "specialization": rng.choice(SPECIALIZATIONS),
+            "licenseNumber": f"LIC{i:07d}",
+            "hospitalId": hospital_id,
+            "status": "APPROVED" if rng.random() < 0.9 else "PENDING",
+            "createdAt": datetime.now(IST),
+        }
+
+
+def gen_patients(args, password_hash, patient_ids):
+    for i, patient_id in enumerate(patient_ids):
+        yield {
+            "_id": patient_id,
+            "name": f"Patient {i}",
+            "email": f"patient{i}@bench.local",
+            "phone": f"8{i:09d}",
+            "passwordHash": password_hash,
+            "role": "PATIENT",
+            "createdAt": datetime.now(IST),
+        }
+
+
+def random_slot(rng, now):
+    # One year of history, one month ahead
+    minutes = rng.randint(-365 * 24 * 60, 30 * 24 * 60)
+    slot = now + timedelta(minutes=minutes)
+    return slot.replace(minute=(slot.minute // SLOT_MINUTES) * SLOT_MINUTES, second=0, microsecond=0)
+
+
+def gen_appointments(args, rng, patient_ids, doctor_ids, now):
+    for _ in range(args.appointments):
+        doctor_id, hospital_id = rng.choice(doctor_ids)
+        slot = random_slot(rng, now)
+        if slot < now:
+            status = rng.choices(["ACCEPTED", "REQUESTED"], weights=[85, 15])[0]
+        else:
+            status = rng.choices(["REQUESTED", "ACCEPTED"], weights=[60, 40])[0]
+        yield {
+            "patientId": rng.choice(patient_ids),
+            "doctorId": doctor_id,
+            "hospitalId": hospital_id,
+            "slot": slot,
+            "status": status,
+            "createdAt": slot - timedelta(days=rng.randint(1, 14)),
+        }
+
+
+def gen_prescriptions(args, rng, patient_ids, doctor_ids, now):
+    for _ in range(args.prescriptions):
+        doctor_id, hospital_id = rng.choice(doctor_ids)
+        prescription = {
+            "patientId": rng.choice(patient_ids),
+            "doctorId": doctor_id,
+            "hospitalId": hospital_id,
+            "appointmentId": object_id(rng),
+            "diagnosis": rng.choice(DIAGNOSES),
+            "medicines": [
+                {"name": name, "dosage": f"{rng.choice([250, 500, 650])}mg", "frequency": "1-0-1", "duration": f"{rng.randint(3, 30)} days"}
+                for name in rng.sample(MEDICINES, rng.randint(1, 4))
+            ],
+            "notes": "Follow up if symptoms persist.",
+            "createdAt": now - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+            "source": "DOCTOR",
+        }
+        prescription["hash"] = hashlib.sha256(json.dumps(prescription, default=str).encode()).hexdigest()
+        yield prescription
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    client = MongoClient(args.mongo_uri)
+
+    if args.drop:
+        client.drop_database(args.db)
+    db = client[args.db]
+
+    # One Argon2 hash shared by every seeded account, hashing per user would dominate the run
+    password_hash = hash_password(BENCH_PASSWORD)
+    now = datetime.now(pytz.utc)
+
+    hospital_ids = [f"HOSP{i:05d}" for i in range(args.hospitals)]
+    doctor_ids = [(object_id(rng), hospital_id) for hospital_id in hospital_ids for _ in range(args.doctors_per_hospital)]
+    patient_ids = [object_id(rng) for _ in range(args.patients)]
+
+    steps = [
+        ("hospitals", db["hospitals"], gen_hospitals(args, rng)),
+        ("doctors", db["users"], gen_doctors(args, rng, password_hash, doctor_ids)),
+        ("patients", db["users"], gen_patients(args, password_hash, patient_ids)),
+        ("appointments", db["appointments"], gen_appointments(args, rng, patient_ids, doctor_ids, now)),
+        ("prescriptions", db["prescriptions"], gen_prescriptions(args, rng, patient_ids, doctor_ids, now)),
+    ]
+
+    for name, col, docs in steps:
+        start = time.perf_counter()
+        count = insert_batches(col, docs, args.batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<14} {count:>10} docs  {elapsed:8.1f}s  {count / max(elapsed, 1e-9):10.0f} docs/s")
+
+    # Only APPROVED doctors can take bookings, keep those for the replay
+    approved = {d["_id"] for d in db["users"].find({"role": "DOCTOR", "status": "APPROVED"}, {"_id": 1})}
+    sample_rng = random.Random(args.seed + 1)
+    manifest = {
+        "db": args.db,
+        "seed": args.seed,
+        "scale": {
+            "hospitals": args.hospitals,
+            "doctors": len(doctor_ids),
+            "patients": args.patients,
+            "appointments": args.appointments,
+            "prescriptions": args.prescriptions,
+        },
+        "password": BENCH_PASSWORD,
+        "hospitals": hospital_ids,
+        "patients": [str(p) for p in sample_rng.sample(patient_ids, min(args.sample_size, len(patient_ids)))],
+        "doctors": [
+            {"id": str(d), "hospitalId": h}
+            for d, h in sample_rng.sample(doctor_ids, min(args.sample_size, len(doctor_ids)))
+            if d in approved
+        ],
+    }
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Manifest written to {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
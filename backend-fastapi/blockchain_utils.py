@@ -1,39 +1,110 @@
 import os
-import json
+import time
+import queue
+import logging
+import threading
 from web3 import Web3
+from web3.exceptions import BadFunctionCallOutput, ContractLogicError
 from eth_account import Account
 from solcx import compile_standard, install_solc
 from dotenv import load_dotenv
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from profiling import record
+from metrics import (
+    CHAIN_RPC_LATENCY, CHAIN_RPC_ERRORS, ACCESS_LOG_QUEUE_DEPTH,
+    CHAIN_BREAKER_STATE, CHAIN_DEGRADED_DECISIONS,
+)
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configuration
 WEB3_PROVIDER = os.getenv("WEB3_PROVIDER", "http://127.0.0.1:8545")
 ADMIN_PRIVATE_KEY = os.getenv("ADMIN_PRIVATE_KEY") # Must be set in .env
 CONTRACT_ADDRESS = os.getenv("CONTRACT_ADDRESS")
+# http: WEB3_PROVIDER (default) | eth-tester: in-process chain with the contract auto-deployed
+CHAIN_BACKEND = os.getenv("CHAIN_BACKEND", "http")
+ACCESS_LOG_QUEUE_SIZE = int(os.getenv("ACCESS_LOG_QUEUE_SIZE", "1000"))
+
+# Deadline of a single JSON-RPC call, instead of the provider's default
+CHAIN_RPC_TIMEOUT_SECONDS = float(os.getenv("CHAIN_RPC_TIMEOUT_SECONDS", "3"))
+CHAIN_BREAKER_FAILURES = int(os.getenv("CHAIN_BREAKER_FAILURES", "5"))
+CHAIN_BREAKER_RESET_SECONDS = float(os.getenv("CHAIN_BREAKER_RESET_SECONDS", "30"))
+# What check_access answers while the chain is unreachable:
+#   deny   - always deny (default)
+#   recent - reuse a decision verified on-chain within CHAIN_DECISION_TTL_SECONDS, else deny
+CHAIN_DEGRADED_POLICY = os.getenv("CHAIN_DEGRADED_POLICY", "deny")
+CHAIN_DECISION_TTL_SECONDS = float(os.getenv("CHAIN_DECISION_TTL_SECONDS", "300"))
+CHAIN_DECISION_CACHE_SIZE = 10000
+# How often a queued access log re-checks a half-open breaker whose probe is held by another call
+ACCESS_LOG_RETRY_SECONDS = 0.5
+
+_worker_lock = threading.Lock()
+_instance_lock = threading.Lock()
+_client = None
+_client_pid = None
+
+chain_breaker = CircuitBreaker(
+    "chain-rpc", CHAIN_BREAKER_FAILURES, CHAIN_BREAKER_RESET_SECONDS,
+    on_state_change=CHAIN_BREAKER_STATE.set
+)
+
+
+class InstrumentedHTTPProvider(Web3.HTTPProvider):
+    """
+    HTTPProvider that reports latency and errors of every JSON-RPC call.
+    Every call goes through chain_breaker: when the node keeps failing, calls
+    raise CircuitOpenError immediately instead of waiting for the timeout.
+    """
+
+    def make_request(self, method, params):
+        chain_breaker.before_call()
+        start = time.perf_counter()
+        try:
+            response = super().make_request(method, params)
+        except Exception:
+            CHAIN_RPC_ERRORS.labels(method).inc()
+            chain_breaker.record_failure()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            CHAIN_RPC_LATENCY.labels(method).observe(elapsed)
+            record("web3", elapsed)
+
+        # A JSON-RPC error (e.g. a revert) still means the node is up
+        chain_breaker.record_success()
+        if isinstance(response, dict) and response.get("error"):
+            CHAIN_RPC_ERRORS.labels(method).inc()
+        return response
 
-# Initialize Web3
-w3 = Web3(Web3.HTTPProvider(WEB3_PROVIDER))
 
 class BlockchainClient:
-    _instance = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(BlockchainClient, cls).__new__(cls)
-            cls._instance._init_client()
-        return cls._instance
-
-    def _init_client(self):
-        self.w3 = w3
+    """
+    Access checks and audit logging against the HealthData contract.
+    `provider` defaults to the instrumented HTTP provider for WEB3_PROVIDER; tests and
+    benchmarks pass an in-process one instead (see local_chain.py). The app itself
+    shares one client per worker through get_blockchain_client().
+    """
+
+    def __init__(self, provider=None, private_key: str = ADMIN_PRIVATE_KEY, contract_address: str = CONTRACT_ADDRESS):
+        if provider is None:
+            provider = InstrumentedHTTPProvider(WEB3_PROVIDER, request_kwargs={"timeout": CHAIN_RPC_TIMEOUT_SECONDS})
+        self.w3 = Web3(provider)
+        self.private_key = private_key
+        self.contract_address = contract_address
+        self._decisions = {}  # (patient, doctor) -> (verified_at, allowed), for degraded mode
         self.account = None
         self.contract = None
+        self._log_queue = queue.Queue(maxsize=ACCESS_LOG_QUEUE_SIZE)
+        self._log_worker = None
+        ACCESS_LOG_QUEUE_DEPTH.set_function(self._log_queue.qsize)
         
-        if ADMIN_PRIVATE_KEY:
-            self.account = Account.from_key(ADMIN_PRIVATE_KEY)
-            print(f"Loaded Admin Wallet: {self.account.address}")
+        if private_key:
+            self.account = Account.from_key(private_key)
+            logger.info("Loaded admin wallet %s", self.account.address)
         else:
-            print("WARNING: ADMIN_PRIVATE_KEY not set. Blockchain writes will fail.")
+            logger.warning("ADMIN_PRIVATE_KEY not set. Blockchain writes will fail.")
 
         self._compile_and_load_contract()
 
@@ -47,7 +118,7 @@ class BlockchainClient:
              contract_path = os.path.abspath("blockchain/contracts/HealthData.sol")
 
         if not os.path.exists(contract_path):
-            print(f"Error: Contract not found at {contract_path}")
+            logger.error("Contract not found at %s", contract_path)
             return
 
         with open(contract_path, "r") as f:
@@ -77,11 +148,11 @@ class BlockchainClient:
         self.abi = compiled_sol["contracts"]["HealthData.sol"]["HealthData"]["abi"]
         self.bytecode = compiled_sol["contracts"]["HealthData.sol"]["HealthData"]["evm"]["bytecode"]["object"]
 
-        if CONTRACT_ADDRESS:
-            self.contract = self.w3.eth.contract(address=CONTRACT_ADDRESS, abi=self.abi)
-            print(f"Loaded Contract at {CONTRACT_ADDRESS}")
+        if self.contract_address:
+            self.contract = self.w3.eth.contract(address=self.contract_address, abi=self.abi)
+            logger.info("Loaded contract at %s", self.contract_address)
         else:
-            print("WARNING: CONTRACT_ADDRESS not set. You valid read/writes require a deployed contract.")
+            logger.warning("CONTRACT_ADDRESS not set. Valid reads/writes require a deployed contract.")
 
     def deploy_contract(self):
         """Helper to deploy contract if not exists"""
@@ -97,7 +168,7 @@ class BlockchainClient:
         })
         
         estimated_gas = self.w3.eth.estimate_gas(construct_txn_call)
-        print(f"Estimated Gas for deployment: {estimated_gas}")
+        logger.info("Estimated gas for deployment: %s", estimated_gas)
 
         construct_txn = Contract.constructor().build_transaction({
             'from': self.account.address,
@@ -106,46 +177,178 @@ class BlockchainClient:
             'gasPrice': self.w3.eth.gas_price
         })
 
-        signed_txn = self.w3.eth.account.sign_transaction(construct_txn, private_key=ADMIN_PRIVATE_KEY)
+        signed_txn = self.w3.eth.account.sign_transaction(construct_txn, private_key=self.private_key)
         tx_hash = self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
         tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
         
-        print(f"Contract Deployed at: {tx_receipt.contractAddress}")
+        logger.info("Contract deployed at %s", tx_receipt.contractAddress)
+        self.contract_address = tx_receipt.contractAddress
         self.contract = self.w3.eth.contract(address=tx_receipt.contractAddress, abi=self.abi)
         return tx_receipt.contractAddress
 
     def check_access(self, patient_address: str, doctor_address: str) -> bool:
-        print(f"[Check] Checking Blockchain Access: {patient_address} -> {doctor_address}")
+        logger.debug("Checking blockchain access: %s -> %s", patient_address, doctor_address)
         if not self.contract:
             return False
         try:
-            return self.contract.functions.checkAccess(patient_address, doctor_address).call()
+            allowed = self.contract.functions.checkAccess(patient_address, doctor_address).call()
         except Exception as e:
-            print(f"Blockchain checkAccess failed: {e}")
-            return False
+            logger.warning("Blockchain checkAccess failed: %s", e)
+            return self._degraded_decision(patient_address, doctor_address)
+        self._remember_decision(patient_address, doctor_address, allowed)
+        return allowed
+
+    def check_access_batch(self, patient_addresses: list, doctor_address: str) -> list:
+        """Access flags for many patients of one doctor, in one eth_call"""
+        if not patient_addresses:
+            return []
+        if not self.contract:
+            return [False] * len(patient_addresses)
+        try:
+            flags = list(self.contract.functions.checkAccessBatch(patient_addresses, doctor_address).call())
+        except (BadFunctionCallOutput, ContractLogicError) as e:
+            # Contract deployed before checkAccessBatch existed
+            logger.warning("checkAccessBatch unavailable (%s), falling back to single checks", e)
+            return [self.check_access(p, doctor_address) for p in patient_addresses]
+        except Exception as e:
+            logger.warning("Blockchain checkAccessBatch failed: %s", e)
+            return [self._degraded_decision(p, doctor_address) for p in patient_addresses]
+
+        for patient_address, allowed in zip(patient_addresses, flags):
+            self._remember_decision(patient_address, doctor_address, allowed)
+        return flags
+
+    def _remember_decision(self, patient_address: str, doctor_address: str, allowed: bool):
+        if len(self._decisions) >= CHAIN_DECISION_CACHE_SIZE:
+            self._decisions = {}
+        self._decisions[(patient_address.lower(), doctor_address.lower())] = (time.monotonic(), allowed)
+
+    def _degraded_decision(self, patient_address: str, doctor_address: str) -> bool:
+        """Answer for an access check the chain could not serve, per CHAIN_DEGRADED_POLICY"""
+        if CHAIN_DEGRADED_POLICY == "recent":
+            decision = self._decisions.get((patient_address.lower(), doctor_address.lower()))
+            if decision and time.monotonic() - decision[0] <= CHAIN_DECISION_TTL_SECONDS:
+                CHAIN_DEGRADED_DECISIONS.labels("recent").inc()
+                return decision[1]
+        CHAIN_DEGRADED_DECISIONS.labels("denied").inc()
+        return False
 
     def log_access(self, patient_address: str, doctor_address: str, resource_id: str):
+        try:
+            return self._send_access_log(patient_address, doctor_address, resource_id)
+        except Exception as e:
+            logger.error("Blockchain logAccess failed: %s", e)
+
+    def _send_access_log(self, patient_address: str, doctor_address: str, resource_id: str):
         if not self.contract or not self.account:
-            print("Cannot log access: Contract or Account missing")
+            logger.warning("Cannot log access: contract or account missing")
             return
 
+        txn = self.contract.functions.logDataAccess(
+            patient_address, doctor_address, resource_id
+        ).build_transaction({
+            'from': self.account.address,
+            'nonce': self.w3.eth.get_transaction_count(self.account.address),
+            'gas': 200000,
+            'gasPrice': self.w3.eth.gas_price
+        })
+        
+        signed_txn = self.w3.eth.account.sign_transaction(txn, private_key=self.private_key)
+        tx_hash = self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+        # We don't wait for receipt to avoid blocking response too long, or maybe we should?
+        # for logs, async is better.
+        logger.info("Access logged", extra={"tx": tx_hash.hex(), "resource": resource_id})
+        return tx_hash.hex()
+
+    def submit_access_log(self, patient_address: str, doctor_address: str, resource_id: str):
+        """
+        Queue a logDataAccess transaction for the background sender.
+        Transactions are sent one at a time, so concurrent requests don't race on the nonce.
+        """
+        if self._log_worker is None:
+            self._start_log_worker()
+
         try:
-            txn = self.contract.functions.logDataAccess(
-                patient_address, doctor_address, resource_id
-            ).build_transaction({
-                'from': self.account.address,
-                'nonce': self.w3.eth.get_transaction_count(self.account.address),
-                'gas': 200000,
-                'gasPrice': self.w3.eth.gas_price
-            })
-            
-            signed_txn = self.w3.eth.account.sign_transaction(txn, private_key=ADMIN_PRIVATE_KEY)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
-            # We don't wait for receipt to avoid blocking response too long, or maybe we should?
-            # for logs, async is better.
-            print(f"Access Logged TX: {tx_hash.hex()}")
-            return tx_hash.hex()
-        except Exception as e:
-            print(f"Blockchain logAccess failed: {e}")
+            self._log_queue.put_nowait((patient_address, doctor_address, resource_id))
+        except queue.Full:
+            logger.warning("Access log queue full, dropping log for %s", resource_id)
+
+    def _start_log_worker(self):
+        with _worker_lock:
+            if self._log_worker is None:
+                self._log_worker = threading.Thread(target=self._drain_log_queue, name="access-log", daemon=True)
+                self._log_worker.start()
+
+    def _drain_log_queue(self):
+        while True:
+            patient_address, doctor_address, resource_id = self._log_queue.get()
+            try:
+                while True:
+                    # Hold the log while the node is down instead of burning it on a fast failure;
+                    # the bounded queue sheds new logs if the outage lasts
+                    while chain_breaker.retry_after() > 0:
+                        time.sleep(chain_breaker.retry_after())
+                    try:
+                        self._send_access_log(patient_address, doctor_address, resource_id)
+                        break
+                    except CircuitOpenError:
+                        # Half-open with the probe taken by another call: wait for its outcome
+                        time.sleep(ACCESS_LOG_RETRY_SECONDS)
+                    except Exception as e:
+                        logger.error("Blockchain logAccess failed: %s", e)
+                        break
+            finally:
+                self._log_queue.task_done()
+
+    def status(self) -> dict:
+        try:
+            connected = self.w3.is_connected()
+        except Exception:
+            connected = False
+        return {
+            "connected": connected,
+            "circuit": ("closed", "half-open", "open")[chain_breaker.state],
+            "contract": self.contract.address if self.contract else None,
+            "account": self.account.address if self.account else None,
+        }
+
+
+def _build_default_client() -> BlockchainClient:
+    if CHAIN_BACKEND == "eth-tester":
+        from local_chain import eth_tester_client
+        return eth_tester_client()
+    return BlockchainClient()
+
+
+def get_blockchain_client() -> BlockchainClient:
+    """One client per worker process, built on first use rather than at import"""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _instance_lock:
+            if _client is None or _client_pid != pid:
+                _client = _build_default_client()
+                _client_pid = pid
+    return _client
+
+
+def set_blockchain_client(client: BlockchainClient):
+    """Inject the client the routes use (e.g. one on an in-process chain)"""
+    global _client, _client_pid
+    with _instance_lock:
+        _client = client
+        _client_pid = os.getpid()
+
+
+def is_blockchain_client_initialized() -> bool:
+    return _client is not None and _client_pid == os.getpid()
+
+
+class _LazyBlockchainClient:
+    """Module-level handle kept for existing imports; the real client is built on first attribute access"""
+
+    def __getattr__(self, attr):
+        return getattr(get_blockchain_client(), attr)
+
 
-blockchain_client = BlockchainClient()
+blockchain_client = _LazyBlockchainClient()
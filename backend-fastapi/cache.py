@@ -0,0 +1,138 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+
+class CacheBackend:
+    """
+    Interface for the per-user read cache.
+    A shared cache (Redis, Memcached...) only has to implement these four methods.
+    Keys are plain strings of the form "<route>:<user_id>", get() returns None on a miss.
+    """
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class InMemoryCache(CacheBackend):
+    """Process-local cache with per-entry TTL and LRU eviction"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_backend: CacheBackend = InMemoryCache()
+
+# Per-key invalidation counters: a load that raced an invalidate() must not store its
+# (pre-write) result. Cleared when it grows past CACHE_MAX_ENTRIES; _resets tells loads
+# that started before the clear apart from ones that didn't.
+_generations = {}
+_resets = 0
+_generation_lock = threading.Lock()
+
+
+def _generation(key: str) -> tuple:
+    with _generation_lock:
+        return _resets, _generations.get(key, 0)
+
+
+def set_backend(backend: CacheBackend):
+    """Swap the cache backend (e.g. for a shared cache across workers)"""
+    global _backend
+    _backend = backend
+
+
+def make_key(route: str, user_id) -> str:
+    return f"{route}:{user_id}"
+
+
+def cached(route: str, user_id, loader, ttl: float = CACHE_TTL_SECONDS, variant: str = "", version=None):
+    """
+    Return the cached value for (route, user_id), calling loader() on a miss.
+    The loader result is shared between requests, so callers must not mutate it.
+    Variants (e.g. sparse fieldsets) of one user's view live in the same entry,
+    so invalidate() still drops all of them with one delete.
+    `version` is the data version (versions.py) read before calling: an entry loaded
+    under another version is a miss, so the body always matches the ETag sent with it,
+    even when the write that bumped the version was served by another worker.
+    """
+    key = make_key(route, user_id)
+    # Read before the entry, so the other variants merged back below are covered too
+    generation = _generation(key)
+    entry = _backend.get(key)
+    variants = entry[1] if entry is not None and entry[0] == version else {}
+    if variant in variants:
+        return variants[variant]
+
+    value = loader()
+    with _generation_lock:
+        # Invalidated while loading: the value may predate the write, serve it uncached
+        if (_resets, _generations.get(key, 0)) == generation:
+            # Storing a new variant renews the entry's TTL; writes invalidate it regardless
+            _backend.set(key, (version, {**variants, variant: value}), ttl)
+    return value
+
+
+def invalidate(user_id, *routes: str):
+    """Drop the cached entries of one user for the given routes"""
+    global _resets
+    with _generation_lock:
+        if len(_generations) >= CACHE_MAX_ENTRIES:
+            _generations.clear()
+            _resets += 1
+        for route in routes:
+            key = make_key(route, user_id)
+            _generations[key] = _generations.get(key, 0) + 1
+            _backend.delete(key)
+
+
+# Route names used as cache keys by the dashboard GETs
+PATIENT_APPOINTMENTS = "appointments:patient"
+DOCTOR_APPOINTMENTS = "appointments:doctor"
+PATIENT_PRESCRIPTIONS = "prescriptions:patient"
+DOCTOR_PRESCRIPTIONS = "prescriptions:doctor"
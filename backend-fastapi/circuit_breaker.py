@@ -0,0 +1,65 @@
+import time
+import threading
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency that is known to be down"""
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+    CLOSED: calls go through, consecutive failures are counted.
+    OPEN: after `failure_threshold` failures, calls fail fast for `reset_timeout` seconds.
+    HALF_OPEN: one probe call is let through; success closes the breaker, failure re-opens it.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2  # also the values exported as a metric
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, on_state_change=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_state_change = on_state_change
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: int):
+        if state != self.state:
+            self.state = state
+            if self.on_state_change:
+                self.on_state_change(state)
+
+    def retry_after(self) -> float:
+        """Seconds until a call would be let through (0 when closed)"""
+        if self.state == self.CLOSED:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+        raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
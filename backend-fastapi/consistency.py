@@ -0,0 +1,99 @@
+"""
+Read routing to replica-set secondaries, with read-your-writes.
+
+With READ_PREFERENCE=primary (the default) nothing changes: no sessions are
+started and every read goes to the primary.
+
+With any other mode, list endpoints read through replica(col) inside a
+causally consistent session. A secondary read in such a session carries
+afterClusterTime, so it waits until the secondary has applied everything the
+session has already seen:
+
+  * write routes run their writes in causal_session(<users involved>); the
+    session's operation/cluster time is remembered for those users (LRU), and
+    read sessions of the same users in this worker start from it;
+  * read routes do their ETag version lookup on the primary in the same session
+    (conditional_get), which advances it past every write already acknowledged,
+    including writes served by another worker.
+
+    READ_PREFERENCE=secondaryPreferred   # primary | primaryPreferred | secondary | secondaryPreferred | nearest
+    READ_MAX_STALENESS_SECONDS=90        # optional, secondaries lagging more are not picked
+"""
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+
+from db import get_client
+
+READ_PREFERENCE = os.getenv("READ_PREFERENCE", "primary")
+READ_MAX_STALENESS_SECONDS = int(os.getenv("READ_MAX_STALENESS_SECONDS", "-1"))
+CAUSAL_USERS_MAX = int(os.getenv("CAUSAL_USERS_MAX", "100000"))
+
+_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+if READ_PREFERENCE not in _MODES:
+    raise ValueError(f"READ_PREFERENCE must be one of {', '.join(_MODES)}, got {READ_PREFERENCE!r}")
+
+if READ_PREFERENCE == "primary":
+    read_preference = Primary()
+else:
+    read_preference = _MODES[READ_PREFERENCE](max_staleness=READ_MAX_STALENESS_SECONDS)
+
+ROUTING_ENABLED = READ_PREFERENCE != "primary"
+
+# user_id -> (operation_time, cluster_time) of that user's latest session in this worker
+_last_seen = OrderedDict()
+_lock = threading.Lock()
+
+
+def replica(col):
+    """The collection with the configured read preference; use it inside causal_session"""
+    if not ROUTING_ENABLED:
+        return col
+    return col.with_options(read_preference=read_preference)
+
+
+def _remember(user_ids, session):
+    operation_time, cluster_time = session.operation_time, session.cluster_time
+    if operation_time is None:
+        return
+    with _lock:
+        for user_id in user_ids:
+            seen = _last_seen.get(user_id)
+            if seen is None or seen[0] < operation_time:
+                _last_seen[user_id] = (operation_time, cluster_time)
+            _last_seen.move_to_end(user_id)
+        while len(_last_seen) > CAUSAL_USERS_MAX:
+            _last_seen.popitem(last=False)
+
+
+@contextmanager
+def causal_session(*user_ids):
+    """
+    Causally consistent session seeded with what these users last saw in this worker.
+    Yields None when routing is disabled; pymongo treats session=None as "no session".
+    """
+    if not ROUTING_ENABLED:
+        yield None
+        return
+
+    user_ids = [str(u) for u in user_ids if u is not None]
+    with get_client().start_session(causal_consistency=True) as session:
+        with _lock:
+            for user_id in user_ids:
+                seen = _last_seen.get(user_id)
+                if seen is not None:
+                    if seen[1] is not None:
+                        session.advance_cluster_time(seen[1])
+                    session.advance_operation_time(seen[0])
+        yield session
+        _remember(user_ids, session)
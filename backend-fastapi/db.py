@@ -1,32 +1,179 @@
 import os
+import logging
+import threading
 from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, TEXT, GEOSPHERE
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
+from metrics import MongoCommandMetrics
 
 load_dotenv()  # load .env file
 
 uri = os.getenv("MONGO_URI")
+DB_NAME = os.getenv("DB_NAME", "ehealth")
+READY_TIMEOUT_MS = int(os.getenv("MONGO_READY_TIMEOUT_MS", "2000"))
 
-client = MongoClient(uri, server_api=ServerApi('1'))
+logger = logging.getLogger(__name__)
 
-try:
-    client.admin.command('ping')
-    print("MongoDB connected successfully!")
-except Exception as e:
-    print("MongoDB connection error:", e)
+# MongoClient starts monitor threads and sockets, which don't survive a fork.
+# Each worker process builds its own client on first use instead of at import.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+# Readiness probes use their own client: maxTimeMS only bounds server-side execution,
+# an unreachable server would hold the probe for the default 30s server selection
+_probe_client = None
+_probe_client_pid = None
+
+
+def get_client() -> MongoClient:
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = MongoClient(uri, server_api=ServerApi('1'), event_listeners=[MongoCommandMetrics()])
+                _client_pid = pid
+    return _client
+
+
+def _get_probe_client() -> MongoClient:
+    global _probe_client, _probe_client_pid
+    pid = os.getpid()
+    if _probe_client is None or _probe_client_pid != pid:
+        with _client_lock:
+            if _probe_client is None or _probe_client_pid != pid:
+                _probe_client = MongoClient(
+                    uri, server_api=ServerApi('1'),
+                    serverSelectionTimeoutMS=READY_TIMEOUT_MS,
+                    connectTimeoutMS=READY_TIMEOUT_MS,
+                    socketTimeoutMS=READY_TIMEOUT_MS,
+                )
+                _probe_client_pid = pid
+    return _probe_client
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def close_client():
+    global _client, _probe_client
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        if _probe_client is not None and _probe_client_pid == os.getpid():
+            _probe_client.close()
+        _client = None
+        _probe_client = None
+
+
+def ping() -> bool:
+    """Readiness probe: True if the primary answers within READY_TIMEOUT_MS"""
+    try:
+        _get_probe_client().admin.command('ping', maxTimeMS=READY_TIMEOUT_MS)
+        return True
+    except Exception as e:
+        logger.error("MongoDB connection error: %s", e)
+        return False
+
+
+class LazyCollection:
+    """
+    Stand-in for a pymongo Collection, resolved through get_client() on first use.
+    Routers keep importing the *_col names as before.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._client = None
+        self._collection = None
+
+    def _resolve(self):
+        client = get_client()
+        if self._client is not client:
+            self._collection = client[DB_NAME][self._name]
+            self._client = client
+        return self._collection
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __getitem__(self, name):
+        return self._resolve()[name]
 
-db = client["ehealth"]
 
 ##------------------- Hospitals -------------------##
 
-hospitals_col = db["hospitals"]
+hospitals_col = LazyCollection("hospitals")
 
 ##------------------- User -------------------##
 
-users_col = db["users"]
+users_col = LazyCollection("users")
 
 ##------------------ Data --------------------##
 
-ehr_col = db["ehr_records"]
-prescriptions_col = db["prescriptions"]
-appointments_col = db["appointments"]
+ehr_col = LazyCollection("ehr_records")
+prescriptions_col = LazyCollection("prescriptions")
+appointments_col = LazyCollection("appointments")
+
+# Per-user / per-hospital version counters behind ETags (see versions.py)
+data_versions_col = LazyCollection("data_versions")
+
+##------------------ Archive (cold tier) --------------------##
+
+appointments_archive_col = LazyCollection("appointments_archive")
+prescriptions_archive_col = LazyCollection("prescriptions_archive")
+
+##------------------ Analytics rollups (see rollups.py) --------------------##
+
+rollup_diagnoses_col = LazyCollection("rollup_diagnoses")
+rollup_medicines_col = LazyCollection("rollup_medicines")
+rollup_appointments_col = LazyCollection("rollup_appointments")
+
+##------------------ Token revocation (see revocation.py) --------------------##
+
+revocations_col = LazyCollection("revocations")
+
+
+def _create_index(col, keys, **kwargs):
+    # One failing index (e.g. unique hospitalId over duplicates) must not skip the others
+    try:
+        col.create_index(keys, **kwargs)
+    except Exception as e:
+        logger.error("Index %s on %s failed: %s", keys, col._name, e)
+
+
+def ensure_indexes():
+    """Indexes behind the dashboard queries, on the hot and the cold tier. Idempotent, failures are logged."""
+    for col in (appointments_col, appointments_archive_col):
+        _create_index(col, [("patientId", ASCENDING), ("slot", DESCENDING)])
+        _create_index(col, [("doctorId", ASCENDING), ("slot", ASCENDING)])
+    _create_index(appointments_col, [("slot", ASCENDING), ("status", ASCENDING)])
+    # Scheduler loads: one status, a slot range
+    _create_index(appointments_col, [("status", ASCENDING), ("slot", ASCENDING)])
+
+    for col in (prescriptions_col, prescriptions_archive_col):
+        _create_index(col, [("patientId", ASCENDING), ("createdAt", DESCENDING)])
+        _create_index(col, [("doctorId", ASCENDING), ("createdAt", DESCENDING)])
+    _create_index(prescriptions_col, [("createdAt", ASCENDING)])
+
+    # Per-patient text search (one text index per collection; patientId prefix keeps scans to one patient)
+    for col in (prescriptions_col, prescriptions_archive_col):
+        _create_index(
+            col,
+            [("patientId", ASCENDING), ("diagnosis", TEXT), ("notes", TEXT), ("medicines.name", TEXT)],
+            weights={"diagnosis": 5, "medicines.name": 5, "notes": 1},
+            name="prescription_text"
+        )
+
+    for col in (rollup_diagnoses_col, rollup_medicines_col):
+        _create_index(col, [("hospitalId", ASCENDING), ("day", ASCENDING)])
+    _create_index(rollup_appointments_col, [("hospitalId", ASCENDING), ("day", ASCENDING), ("doctorId", ASCENDING)])
+
+    # Registry imports upsert by hospitalId; location is what nearby searches query
+    _create_index(hospitals_col, [("hospitalId", ASCENDING)], unique=True)
+    _create_index(hospitals_col, [("location", GEOSPHERE)])
+
+    # Revocations outlive the tokens they cover by at most the TTL monitor's minute
+    _create_index(revocations_col, [("expiresAt", ASCENDING)], expireAfterSeconds=0)
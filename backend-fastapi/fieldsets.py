@@ -0,0 +1,57 @@
+"""
+Sparse fieldsets for list endpoints: ?fields=hospitalId,hospitalName
+
+The requested fields are checked against the endpoint's allowlist and pushed down
+into the Mongo projection, so unrequested fields are neither decoded nor sent.
+Without `fields` an endpoint returns its usual full shape.
+"""
+from typing import Optional
+from fastapi import HTTPException
+
+# Hospital list / detail
+HOSPITAL_FIELDS = frozenset({"hospitalId", "hospitalName", "city", "state", "location"})
+
+# Prescription lists (patient and doctor dashboards); _id is always returned
+PRESCRIPTION_FIELDS = frozenset({
+    "patientId", "doctorId", "hospitalId", "appointmentId", "diagnosis", "medicines",
+    "notes", "createdAt", "source", "hash", "doctorName", "hospitalName", "attachments",
+})
+
+# Appointment lists. Looked-up fields cost a query per row and are only resolved when asked for
+APPOINTMENT_FIELDS = frozenset({"patientId", "doctorId", "hospitalId", "slot", "status"})
+PATIENT_APPOINTMENT_LOOKUPS = {
+    "doctorName": "doctor", "specialization": "doctor", "doctorWallet": "doctor",
+    "hospitalName": "hospital", "hospitalCity": "hospital", "hospitalCoords": "hospital",
+}
+DOCTOR_APPOINTMENT_LOOKUPS = {"patientName": "patient", "patientEmail": "patient"}
+
+
+def parse_fields(fields: Optional[str], allowed) -> Optional[frozenset]:
+    """None when the client asked for everything, else the validated set of field names"""
+    if fields is None:
+        return None
+    requested = frozenset(f.strip() for f in fields.split(",") if f.strip())
+    if not requested:
+        raise HTTPException(400, "fields must name at least one field")
+    unknown = requested - set(allowed)
+    if unknown:
+        raise HTTPException(
+            400, f"Unknown field(s): {', '.join(sorted(unknown))}. Allowed: {', '.join(sorted(allowed))}"
+        )
+    return requested
+
+
+def projection(fields: Optional[frozenset], default: Optional[dict] = None, include_id: bool = True,
+               extra=()) -> Optional[dict]:
+    """Mongo projection for `fields`; `extra` are stored fields needed to compute others"""
+    if fields is None:
+        return default
+    proj = {name: 1 for name in fields | frozenset(extra)} or {"_id": 1}
+    if not include_id:
+        proj["_id"] = 0
+    return proj
+
+
+def variant(fields: Optional[frozenset]) -> str:
+    """Stable key suffix for caches keyed per fieldset"""
+    return ",".join(sorted(fields)) if fields else ""
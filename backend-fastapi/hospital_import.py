@@ -0,0 +1,214 @@
+"""
+Bulk import of hospital registries (CSV or NDJSON), streamed in constant memory.
+
+    python hospital_import.py registry.csv
+    python hospital_import.py registry.ndjson --format ndjson --batch-size 2000
+
+The same code backs POST /system-admin/hospitals/import. One record per line:
+
+  csv      header row first; hospitalId, hospitalName, city, state, latitude, longitude
+           (lat/lng are accepted too, other columns are ignored)
+  ndjson   one JSON object per line with the same keys, or a GeoJSON `location` Point
+
+Coordinates become a GeoJSON Point [longitude, latitude]. A row without coordinates
+is imported without a location; a row with only one of them, or one out of range, is
+rejected. Rows are upserted by hospitalId in unordered bulk_write batches, so an import
+can be re-run and only the given fields are overwritten.
+"""
+import os
+import io
+import csv
+import sys
+import json
+import math
+import logging
+import argparse
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from db import hospitals_col
+from hospital_registry import hospital_registry
+from versions import bump, HOSPITALS_SCOPE
+
+IMPORT_BATCH_SIZE = int(os.getenv("HOSPITAL_IMPORT_BATCH_SIZE", "1000"))
+# Rejected rows beyond this are counted but not itemised in the report
+IMPORT_MAX_ERRORS = int(os.getenv("HOSPITAL_IMPORT_MAX_ERRORS", "100"))
+
+FORMATS = ("csv", "ndjson")
+TEXT_FIELDS = ("hospitalName", "city", "state")
+
+logger = logging.getLogger(__name__)
+
+
+def _coordinate(value, name: str, limit: float):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be a number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number, got {value!r}")
+    if not math.isfinite(number) or not -limit <= number <= limit:
+        raise ValueError(f"{name} must be between -{limit:g} and {limit:g}, got {value!r}")
+    return number
+
+
+def _location(record: dict):
+    location = record.get("location")
+    if location is not None:
+        if not isinstance(location, dict) or location.get("type") != "Point":
+            raise ValueError("location must be a GeoJSON Point")
+        coordinates = location.get("coordinates")
+        if not isinstance(coordinates, (list, tuple)) or len(coordinates) != 2:
+            raise ValueError("location.coordinates must be [longitude, latitude]")
+        longitude, latitude = coordinates
+    else:
+        latitude = record.get("latitude", record.get("lat"))
+        longitude = record.get("longitude", record.get("lng"))
+
+    latitude = _coordinate(latitude, "latitude", 90)
+    longitude = _coordinate(longitude, "longitude", 180)
+    if latitude is None and longitude is None:
+        return None
+    if latitude is None or longitude is None:
+        raise ValueError("latitude and longitude must be given together")
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def normalize(record: dict) -> dict:
+    """The hospital document for one registry record; ValueError when it is invalid"""
+    if not isinstance(record, dict):
+        raise ValueError("record must be an object")
+
+    hospital_id = str(record.get("hospitalId") or "").strip()
+    if not hospital_id:
+        raise ValueError("hospitalId is required")
+
+    doc = {"hospitalId": hospital_id}
+    for field in TEXT_FIELDS:
+        value = record.get(field)
+        if value is not None and str(value).strip():
+            doc[field] = str(value).strip()
+    if "hospitalName" not in doc:
+        raise ValueError("hospitalName is required")
+
+    location = _location(record)
+    if location is not None:
+        doc["location"] = location
+    return doc
+
+
+class HospitalImport:
+    """
+    One import run. Feed it lines with add_line(); whenever it returns True a batch
+    is full and write_batch() must be called before feeding more. finish() writes
+    the rest and returns the report. Only one batch is held in memory.
+    """
+
+    def __init__(self, fmt: str = "csv", batch_size: int = IMPORT_BATCH_SIZE):
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        self.fmt = fmt
+        self.batch_size = max(1, batch_size)
+        self.header = None
+        self.line_no = 0
+        self.pending = []  # (line_no, UpdateOne)
+        self.report = {"received": 0, "upserted": 0, "modified": 0, "matched": 0, "rejected": 0, "errors": []}
+
+    def _reject(self, line_no: int, reason: str):
+        self.report["rejected"] += 1
+        if len(self.report["errors"]) < IMPORT_MAX_ERRORS:
+            self.report["errors"].append({"line": line_no, "error": reason})
+
+    def _parse(self, line: str):
+        if self.fmt == "ndjson":
+            return json.loads(line)
+        values = next(csv.reader([line]))
+        if self.header is None:
+            self.header = [name.strip() for name in values]
+            return None
+        if len(values) != len(self.header):
+            raise ValueError(f"expected {len(self.header)} columns, got {len(values)}")
+        return dict(zip(self.header, values))
+
+    def add_line(self, line: str) -> bool:
+        self.line_no += 1
+        line = line.strip("\r\n")
+        if not line.strip():
+            return False
+        if self.line_no == 1:
+            line = line.lstrip("\ufeff")
+
+        try:
+            record = self._parse(line)
+        except (ValueError, csv.Error) as e:  # JSONDecodeError is a ValueError
+            self.report["received"] += 1
+            self._reject(self.line_no, str(e))
+            return False
+        if record is None:  # CSV header
+            return False
+
+        self.report["received"] += 1
+        try:
+            doc = normalize(record)
+        except ValueError as e:
+            self._reject(self.line_no, str(e))
+            return False
+
+        self.pending.append((self.line_no, UpdateOne({"hospitalId": doc["hospitalId"]}, {"$set": doc}, upsert=True)))
+        return len(self.pending) >= self.batch_size
+
+    def write_batch(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        try:
+            result = hospitals_col.bulk_write([op for _, op in batch], ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            # Unordered: everything but the failed operations was applied
+            result = e.details
+            for error in result.get("writeErrors", []):
+                self._reject(batch[error["index"]][0], error.get("errmsg", "write failed"))
+        self.report["upserted"] += result.get("nUpserted", 0)
+        self.report["modified"] += result.get("nModified", 0)
+        self.report["matched"] += result.get("nMatched", 0)
+
+    def finish(self) -> dict:
+        self.write_batch()
+        if self.report["upserted"] or self.report["modified"]:
+            bump(HOSPITALS_SCOPE)
+            hospital_registry.invalidate()
+        if self.report["rejected"] > len(self.report["errors"]):
+            self.report["errors_truncated"] = True
+        logger.info("Hospital import finished", extra={k: v for k, v in self.report.items() if k != "errors"})
+        return self.report
+
+
+def import_lines(lines, fmt: str = "csv", batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    job = HospitalImport(fmt, batch_size)
+    for line in lines:
+        if job.add_line(line):
+            job.write_batch()
+    return job.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Registry file, - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="Default: from the file extension, else csv")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    if args.path == "-":
+        report = import_lines(io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8"), fmt, args.batch_size)
+    else:
+        with open(args.path, encoding="utf-8", newline="") as f:
+            report = import_lines(f, fmt, args.batch_size)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+In-process snapshot of the hospitals collection, indexed by hospitalId.
+
+Hospitals change rarely (registry imports), but they are looked up on every
+appointment list and dashboard. Routers resolve them through hospital_registry,
+which serves an immutable snapshot: lookups are dict reads, never a query.
+
+At most every HOSPITAL_REGISTRY_CHECK_SECONDS one request thread reads the
+hospitals version stamp (versions.HOSPITALS_SCOPE, bumped by imports); when it
+moved, or the snapshot is older than HOSPITAL_REGISTRY_MAX_AGE_SECONDS (edits made
+straight in Mongo bump nothing), the collection is reloaded into a new snapshot that
+replaces the old one in a single assignment. Other threads keep reading the old one
+meanwhile. Snapshots and the documents in them are shared: callers must not mutate them.
+"""
+import os
+import time
+import logging
+import threading
+from types import MappingProxyType
+from typing import Optional
+
+from db import hospitals_col
+from versions import get_versions, HOSPITALS_SCOPE
+
+HOSPITAL_REGISTRY_CHECK_SECONDS = float(os.getenv("HOSPITAL_REGISTRY_CHECK_SECONDS", "5"))
+HOSPITAL_REGISTRY_MAX_AGE_SECONDS = float(os.getenv("HOSPITAL_REGISTRY_MAX_AGE_SECONDS", "300"))
+
+logger = logging.getLogger(__name__)
+
+
+def project(hospital: dict, fields: Optional[frozenset]) -> dict:
+    """The hospital restricted to a sparse fieldset (see fieldsets.py); None keeps every field"""
+    if fields is None:
+        return hospital
+    return {k: v for k, v in hospital.items() if k in fields}
+
+
+class HospitalSnapshot:
+    __slots__ = ("version", "loaded_at", "hospitals", "by_id", "_listings")
+
+    def __init__(self, version: int, hospitals):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.hospitals = tuple(hospitals)
+        self.by_id = MappingProxyType({h["hospitalId"]: h for h in self.hospitals if h.get("hospitalId")})
+        self._listings = {}  # fieldset -> projected list, filled on first use
+
+    def get(self, hospital_id) -> Optional[dict]:
+        return self.by_id.get(hospital_id)
+
+    def listing(self, fields: Optional[frozenset] = None) -> list:
+        """All hospitals, projected once per fieldset for the lifetime of the snapshot"""
+        listing = self._listings.get(fields)
+        if listing is None:
+            listing = self._listings[fields] = [project(h, fields) for h in self.hospitals]
+        return listing
+
+
+class HospitalRegistry:
+    def __init__(self):
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> HospitalSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._load()
+        elif time.monotonic() - self._checked_at > HOSPITAL_REGISTRY_CHECK_SECONDS:
+            self._check(snapshot)
+        return self._snapshot
+
+    def get(self, hospital_id) -> Optional[dict]:
+        return self.snapshot().get(hospital_id)
+
+    def invalidate(self):
+        """Check the version stamp on the next lookup, e.g. right after an import"""
+        self._checked_at = 0.0
+
+    def _load(self, version: int = None):
+        # Version first: a write racing the load leaves the snapshot looking older, never newer
+        if version is None:
+            version = get_versions(HOSPITALS_SCOPE)[HOSPITALS_SCOPE]
+        snapshot = HospitalSnapshot(version, hospitals_col.find({}, {"_id": 0}))
+        self._snapshot = snapshot
+        self._checked_at = time.monotonic()
+        logger.info("Hospital registry loaded", extra={"version": version, "hospitals": len(snapshot.hospitals)})
+
+    def _check(self, snapshot: HospitalSnapshot):
+        # One thread checks; the others carry on with the current snapshot
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            version = get_versions(HOSPITALS_SCOPE)[HOSPITALS_SCOPE]
+            if version != snapshot.version or time.monotonic() - snapshot.loaded_at > HOSPITAL_REGISTRY_MAX_AGE_SECONDS:
+                self._load(version)
+        except Exception:
+            logger.exception("Hospital registry refresh failed, serving the previous snapshot")
+        finally:
+            self._lock.release()
+
+
+hospital_registry = HospitalRegistry()
@@ -0,0 +1,72 @@
+"""
+In-process chain for tests and benchmarks: py-evm through eth-tester, no Ganache needed.
+
+    CHAIN_BACKEND=eth-tester uvicorn main:app      # the app on a throwaway chain
+    python test_blockchain.py                      # same, with CHAIN_BACKEND=eth-tester
+
+eth_tester_client() generates an admin key, funds it from the tester's pre-funded
+accounts and deploys HealthData.sol, so the client is usable right away. The chain
+lives in memory and is gone with the process.
+Needs the optional packages: pip install "eth-tester[py-evm]"
+"""
+from eth_account import Account
+from web3 import Web3
+
+from blockchain_utils import BlockchainClient
+
+try:
+    from web3 import EthereumTesterProvider
+    from eth_tester import EthereumTester
+except ImportError:  # optional dependency
+    EthereumTesterProvider = None
+
+FUNDING_ETHER = 1000
+
+
+def _require_eth_tester():
+    if EthereumTesterProvider is None:
+        raise RuntimeError('The in-process chain needs eth-tester: pip install "eth-tester[py-evm]"')
+
+
+def fund(w3: Web3, address: str, ether: float = FUNDING_ETHER):
+    """Send ether from the tester's first pre-funded (unlocked) account"""
+    tx_hash = w3.eth.send_transaction({
+        "from": w3.eth.accounts[0],
+        "to": address,
+        "value": w3.to_wei(ether, "ether"),
+    })
+    w3.eth.wait_for_transaction_receipt(tx_hash)
+
+
+def eth_tester_client(deploy: bool = True) -> BlockchainClient:
+    _require_eth_tester()
+    provider = EthereumTesterProvider(EthereumTester())
+
+    admin = Account.create()
+    client = BlockchainClient(provider=provider, private_key=admin.key.hex(), contract_address=None)
+    fund(client.w3, admin.address)
+    if deploy:
+        client.deploy_contract()
+    return client
+
+
+def new_account(client: BlockchainClient, ether: float = 10):
+    """A funded account on the client's chain, e.g. to act as a patient"""
+    account = Account.create()
+    fund(client.w3, account.address, ether)
+    return account
+
+
+def grant_access(client: BlockchainClient, patient, doctor_address: str) -> str:
+    """Sign and send grantAccess(doctor) from the patient's account"""
+    w3 = client.w3
+    txn = client.contract.functions.grantAccess(doctor_address).build_transaction({
+        "from": patient.address,
+        "nonce": w3.eth.get_transaction_count(patient.address),
+        "gas": 200000,
+        "gasPrice": w3.eth.gas_price,
+    })
+    signed = w3.eth.account.sign_transaction(txn, private_key=patient.key)
+    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
+    w3.eth.wait_for_transaction_receipt(tx_hash)
+    return tx_hash.hex()
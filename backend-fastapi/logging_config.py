@@ -0,0 +1,142 @@
+"""
+Structured, non-blocking logging.
+
+Records are put on an in-memory queue by a QueueHandler on the request path and
+written as one JSON object per line by a QueueListener thread, so a slow or
+contended stdout never stalls a request. Every record carries the id of the
+request it was logged from (X-Request-ID, generated if the client sent none).
+
+    LOG_LEVEL=DEBUG    # default INFO; below the level, logger.debug(...) returns before formatting
+"""
+import os
+import sys
+import copy
+import json
+import uuid
+import queue
+import atexit
+import logging
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Records logged while the queue is full are dropped rather than blocking the request
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+request_id: ContextVar = ContextVar("request_id", default=None)
+
+_listener = None
+_listener_pid = None
+_setup_lock = threading.Lock()
+
+# Attributes every LogRecord has; anything else was passed through extra={...}
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "request_id"}
+_plain = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _RequestQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Runs in the caller's context, where the request id is still visible.
+        # Arguments and tracebacks are rendered here, the listener may see them later
+        record = copy.copy(record)
+        # An explicit extra={"request_id": ...} wins, for code running outside the request context
+        record.request_id = getattr(record, "request_id", None) or request_id.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _plain.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def setup_logging():
+    """Route the root logger through the queue. Idempotent; restarts the listener in a forked worker."""
+    global _listener, _listener_pid
+    with _setup_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            return
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter())
+
+        root = logging.getLogger()
+        for handler in [h for h in root.handlers if isinstance(h, _RequestQueueHandler)]:
+            root.removeHandler(handler)
+        root.addHandler(_RequestQueueHandler(log_queue))
+        root.setLevel(LOG_LEVEL)
+
+        _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        _listener_pid = os.getpid()
+
+
+def stop_logging():
+    """Flush what is queued and stop the writer thread"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+class RequestIdMiddleware:
+    """Sets the request id for the duration of a request and echoes it as X-Request-ID"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                rid = value.decode("latin-1")[:64]
+                break
+        rid = rid or uuid.uuid4().hex
+        # The app's exception handler runs outside this middleware, after the ContextVar
+        # is reset; it reads the id from request.state instead
+        scope.setdefault("state", {})["request_id"] = rid
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((b"x-request-id", rid.encode("latin-1")))
+            await send(message)
+
+        token = request_id.set(rid)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id.reset(token)
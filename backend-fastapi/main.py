@@ -1,8 +1,46 @@
+import logging
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import register, login, admin, appointments, prescriptions, hospitals, users
+import db
+from blockchain_utils import get_blockchain_client, is_blockchain_client_initialized
+from metrics import PrometheusMiddleware, render_metrics
+import profiling
+from scheduler import appointment_scheduler, SCHEDULER_ENABLED
+import revocation
+from logging_config import setup_logging, RequestIdMiddleware
+from routes import register, login, admin, appointments, prescriptions, hospitals, users, system_admin, attachments
 
-app = FastAPI(title="Secure E-Health Platform")
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """Connect Mongo and build the blockchain client in the background, once per worker"""
+    if db.ping():
+        db.ensure_indexes()
+    try:
+        get_blockchain_client()
+    except Exception as e:
+        logger.error("Blockchain client init failed: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing heavy happens at import or before uvicorn forks: each worker starts
+    # serving immediately and builds its own clients (lazily, or via warm_up)
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    revocation.start()
+    if SCHEDULER_ENABLED:
+        appointment_scheduler.start()
+    yield
+    appointment_scheduler.stop()
+    revocation.stop()
+    db.close_client()
+
+
+app = FastAPI(title="Secure E-Health Platform", lifespan=lifespan)
 
 
 app.add_middleware(
@@ -18,31 +56,69 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(PrometheusMiddleware)
+app.add_middleware(RequestIdMiddleware)
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
 
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi import Request
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    print(f"🔥 UNHANDLED ERROR: {exc}")
+    # Runs in the outermost middleware, where the request id ContextVar is no longer set
+    rid = getattr(request.state, "request_id", None)
+    logger.error("Unhandled error on %s %s", request.method, request.url.path,
+                 exc_info=(type(exc), exc, exc.__traceback__), extra={"request_id": rid})
+    headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "*",
+        "Access-Control-Allow-Headers": "*",
+    }
+    if rid:
+        headers["X-Request-ID"] = rid
     return JSONResponse(
         status_code=500,
         content={"detail": "Internal Server Error", "error": str(exc)},
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "*",
-            "Access-Control-Allow-Headers": "*",
-        },
+        headers=headers,
     )
 
-app.include_router(register.router)
-app.include_router(login.router)
-app.include_router(admin.router)
-app.include_router(appointments.router)
-app.include_router(prescriptions.router)
-app.include_router(hospitals.router)
-app.include_router(users.router)
+for router in (register.router, login.router, admin.router, appointments.router,
+               prescriptions.router, hospitals.router, users.router, system_admin.router,
+               attachments.router):
+    if profiling.PROFILING_ENABLED:
+        profiling.instrument_routes(router)
+    app.include_router(router)
 
 @app.get("/")
 def root():
     return {"status": "E-Health Backend Running"}
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the worker is up and its event loop responds"""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+def readyz():
+    """Readiness: Mongo is required, the blockchain is reported but optional"""
+    mongo_ok = db.ping()
+
+    if is_blockchain_client_initialized():
+        chain = get_blockchain_client().status()
+    else:
+        chain = {"status": "initializing"}
+
+    return JSONResponse(
+        status_code=200 if mongo_ok else 503,
+        content={
+            "status": "ready" if mongo_ok else "not_ready",
+            "mongo": "ok" if mongo_ok else "unavailable",
+            "blockchain": chain,
+        },
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,149 @@
+import time
+from pymongo import monitoring
+from profiling import record
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+##------------------- HTTP -------------------##
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served",
+)
+
+##------------------- MongoDB -------------------##
+
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency",
+    ["command", "collection"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+MONGO_COMMANDS = Counter(
+    "mongo_commands_total",
+    "MongoDB commands by outcome",
+    ["command", "collection", "outcome"],
+)
+
+##------------------- Blockchain -------------------##
+
+CHAIN_RPC_LATENCY = Histogram(
+    "chain_rpc_duration_seconds",
+    "web3 JSON-RPC latency",
+    ["method"],
+)
+CHAIN_RPC_ERRORS = Counter(
+    "chain_rpc_errors_total",
+    "web3 JSON-RPC calls that raised or returned an error",
+    ["method"],
+)
+CHAIN_BREAKER_STATE = Gauge(
+    "chain_circuit_breaker_state",
+    "Circuit breaker around the RPC node: 0 closed, 1 half-open, 2 open",
+)
+CHAIN_DEGRADED_DECISIONS = Counter(
+    "chain_degraded_decisions_total",
+    "Access checks answered without the chain, by outcome",
+    ["outcome"],
+)
+ACCESS_LOG_QUEUE_DEPTH = Gauge(
+    "chain_access_log_queue_depth",
+    "logDataAccess transactions waiting to be sent",
+)
+
+##------------------- Threadpool -------------------##
+
+THREADPOOL_BUSY = Gauge(
+    "threadpool_busy_threads",
+    "Worker threads currently running sync endpoints",
+)
+THREADPOOL_SIZE = Gauge(
+    "threadpool_max_threads",
+    "Size of the threadpool used for sync endpoints",
+)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records latency and outcome of every command sent by the driver"""
+
+    def __init__(self):
+        self._collections = {}  # request_id -> collection name
+
+    def started(self, event):
+        # The collection is only part of the started event, keep it until the reply
+        self._collections[event.request_id] = _collection_of(event)
+
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        record("mongo", event.duration_micros / 1e6)
+        MONGO_COMMAND_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGO_COMMANDS.labels(event.command_name, collection, "success").inc()
+
+    def failed(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        record("mongo", event.duration_micros / 1e6)
+        MONGO_COMMAND_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGO_COMMANDS.labels(event.command_name, collection, "failure").inc()
+
+
+def _collection_of(event) -> str:
+    value = event.command.get(event.command_name)
+    return value if isinstance(value, str) else ""
+
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware recording one latency sample per request.
+    Requests are labelled with the route template ("/prescriptions/patient/{patient_id}")
+    instead of the raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            route_path = getattr(route, "path", "<unmatched>")
+            REQUEST_LATENCY.labels(scope["method"], route_path, str(status_code)).observe(
+                time.perf_counter() - start
+            )
+
+
+def _update_threadpool_gauges():
+    from anyio.to_thread import current_default_thread_limiter
+
+    try:
+        limiter = current_default_thread_limiter()
+    except Exception:
+        return  # no event loop in this thread
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_SIZE.set(limiter.total_tokens)
+
+
+def render_metrics():
+    """Return (body, content_type) for the /metrics endpoint"""
+    _update_threadpool_gauges()
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,218 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries `X-Profile-Token: <PROFILE_TOKEN>` or is picked
+by PROFILE_SAMPLE_RATE. Its endpoint runs under cProfile and the wall-clock time is
+split between Mongo, web3, Argon2 and response serialization. The result is written
+to PROFILE_DIR, which keeps the newest PROFILE_RING_SIZE profiles:
+
+    <id>.json   summary, time split and the top functions
+    <id>.prof   raw cProfile stats (snakeviz, pstats)
+
+With neither setting the middleware is not installed and record() is a ContextVar lookup.
+"""
+import os
+import io
+import json
+import hmac
+import time
+import uuid
+import random
+import pstats
+import asyncio
+import cProfile
+import threading
+import functools
+import inspect
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from fastapi.routing import APIRoute
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", "50"))
+
+PROFILING_ENABLED = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+CATEGORIES = ("mongo", "web3", "argon2")
+
+_current: ContextVar = ContextVar("request_profile", default=None)
+_ring_lock = threading.Lock()
+# cProfile allows one active profiler per process on 3.12+ (sys.monitoring); concurrent
+# profiled requests run unprofiled instead of failing
+_profiler_lock = threading.Lock()
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.seconds = dict.fromkeys(CATEGORIES, 0.0)
+        self.calls = dict.fromkeys(CATEGORIES, 0)
+        self.endpoint_done = None
+        self.response_started = None
+        self.profiler = None
+        self._lock = threading.Lock()
+
+    def add(self, category: str, seconds: float):
+        with self._lock:
+            self.seconds[category] += seconds
+            self.calls[category] += 1
+
+
+def record(category: str, seconds: float):
+    """Attribute time to the request being profiled, if any. Called by the Mongo, web3 and Argon2 hooks."""
+    profile = _current.get()
+    if profile is not None:
+        profile.add(category, seconds)
+
+
+def _start_profiler(profile: RequestProfile) -> bool:
+    """Enable cProfile for this request if no other request holds it. Never raises."""
+    if not _profiler_lock.acquire(blocking=False):
+        return False
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool (a debugger, coverage) is active
+        _profiler_lock.release()
+        return False
+    profile.profiler = profiler
+    return True
+
+
+def _stop_profiler(profile: RequestProfile):
+    profile.profiler.disable()
+    _profiler_lock.release()
+
+
+def _profiled(func):
+    """Wrap an endpoint so it runs under cProfile when its request is being profiled"""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return await func(*args, **kwargs)
+            profiling = _start_profiler(profile)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                if profiling:
+                    _stop_profiler(profile)
+                profile.endpoint_done = time.perf_counter()
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Sync endpoints run in the threadpool; cProfile has to be enabled in that thread
+        profile = _current.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        profiling = _start_profiler(profile)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if profiling:
+                _stop_profiler(profile)
+            profile.endpoint_done = time.perf_counter()
+    return wrapper
+
+
+def instrument_routes(router):
+    """Call on each router before it is included: included routes are built from route.endpoint"""
+    for route in router.routes:
+        if isinstance(route, APIRoute) and not hasattr(route.endpoint, "__profiled__"):
+            route.endpoint = _profiled(route.endpoint)
+            route.endpoint.__profiled__ = True
+            route.dependant.call = route.endpoint
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    def _wanted(self, scope) -> bool:
+        if PROFILE_TOKEN:
+            for name, value in scope["headers"]:
+                if name == b"x-profile-token":
+                    # Bytes: compare_digest rejects non-ASCII str, a crafted header would be a 500
+                    return hmac.compare_digest(value, PROFILE_TOKEN.encode())
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                profile.response_started = time.perf_counter()
+                status_code = message["status"]
+                message.setdefault("headers", []).append((b"x-profile-id", profile.id.encode()))
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            total = time.perf_counter() - profile.started
+            route = getattr(scope.get("route"), "path", None)
+            await asyncio.to_thread(_write_profile, profile, route, status_code, total)
+
+
+def _write_profile(profile: RequestProfile, route: str, status_code: int, total: float):
+    split = {f"{c}_ms": round(profile.seconds[c] * 1000, 3) for c in CATEGORIES}
+    if profile.endpoint_done and profile.response_started:
+        split["serialization_ms"] = round(max(0.0, profile.response_started - profile.endpoint_done) * 1000, 3)
+    split["other_ms"] = round(max(0.0, total * 1000 - sum(split.values())), 3)
+
+    top = ""
+    if profile.profiler is not None:
+        out = io.StringIO()
+        pstats.Stats(profile.profiler, stream=out).sort_stats("cumulative").print_stats(30)
+        top = out.getvalue()
+
+    summary = {
+        "id": profile.id,
+        "at": datetime.now(timezone.utc).isoformat(),
+        "method": profile.method,
+        "path": profile.path,
+        "route": route,
+        "status": status_code,
+        "total_ms": round(total * 1000, 3),
+        "split": split,
+        "calls": profile.calls,
+        "top_functions": top,
+    }
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, profile.id)
+    with open(base + ".json", "w") as f:
+        json.dump(summary, f, indent=2)
+    if profile.profiler is not None:
+        profile.profiler.dump_stats(base + ".prof")
+
+    _trim_ring()
+
+
+def _trim_ring():
+    # Ids start with a millisecond timestamp, so name order is age order
+    with _ring_lock:
+        ids = sorted({name.rsplit(".", 1)[0] for name in os.listdir(PROFILE_DIR)})
+        for old in ids[:max(0, len(ids) - PROFILE_RING_SIZE)]:
+            for ext in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, old + ext))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,104 @@
+import os
+import math
+import time
+import asyncio
+import threading
+from fastapi import HTTPException, Request
+
+# Token buckets: RATE tokens per second, up to BURST stored
+AUTH_IP_RATE = float(os.getenv("AUTH_IP_RATE", "1"))
+AUTH_IP_BURST = int(os.getenv("AUTH_IP_BURST", "20"))
+AUTH_ACCOUNT_RATE = float(os.getenv("AUTH_ACCOUNT_RATE", "0.1"))
+AUTH_ACCOUNT_BURST = int(os.getenv("AUTH_ACCOUNT_BURST", "5"))
+
+# Argon2 requests running at once (roughly the number of cores), and how long
+# a request may wait for a free slot before it is shed with a 503
+AUTH_MAX_CONCURRENCY = int(os.getenv("AUTH_MAX_CONCURRENCY", str(os.cpu_count() or 2)))
+AUTH_QUEUE_TIMEOUT_SECONDS = float(os.getenv("AUTH_QUEUE_TIMEOUT_SECONDS", "0.5"))
+
+
+class RateLimitBackend:
+    """
+    Interface for token-bucket storage.
+    take() consumes one token and returns 0, or returns the seconds until one is available.
+    A shared store (Redis...) implementing it makes the limits global across workers.
+    """
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        raise NotImplementedError
+
+
+class InMemoryRateLimiter(RateLimitBackend):
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated_at, full_at)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            if len(self._buckets) > self.max_keys:
+                self._purge(now)
+        return wait
+
+    def _purge(self, now: float):
+        # A bucket that has refilled completely is the same as no bucket
+        self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+
+
+_backend: RateLimitBackend = InMemoryRateLimiter()
+_auth_slots = asyncio.Semaphore(AUTH_MAX_CONCURRENCY)
+
+
+def set_backend(backend: RateLimitBackend):
+    global _backend
+    _backend = backend
+
+
+def _throttle(scope: str, key: str, rate: float, burst: int):
+    wait = _backend.take(f"{scope}:{key}", rate, burst)
+    if wait > 0:
+        raise HTTPException(
+            429,
+            "Too many attempts, try again later",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
+
+
+async def auth_admission(request: Request):
+    """
+    Dependency for the Argon2-heavy login and register routes.
+    Rejects over-limit clients (per IP and per account email) with 429 before any hashing,
+    then caps how many of these requests run at once, shedding the excess with 503.
+    """
+    ip = request.client.host if request.client else "unknown"
+    _throttle("ip", ip, AUTH_IP_RATE, AUTH_IP_BURST)
+
+    # FastAPI has already parsed the body for the route, this reads the cached copy
+    try:
+        body = await request.json()
+    except Exception:
+        body = None
+    email = body.get("email") if isinstance(body, dict) else None
+    if isinstance(email, str):
+        _throttle("account", email.strip().lower(), AUTH_ACCOUNT_RATE, AUTH_ACCOUNT_BURST)
+
+    try:
+        await asyncio.wait_for(_auth_slots.acquire(), AUTH_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(503, "Server busy, try again shortly", headers={"Retry-After": "1"})
+
+    try:
+        yield
+    finally:
+        _auth_slots.release()
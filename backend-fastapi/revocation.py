@@ -0,0 +1,141 @@
+"""
+Revocation of access tokens before they expire.
+
+Two kinds of entries live in the small "revocations" collection:
+
+  user    every token of a subject issued before `notBefore` (e.g. a rejected doctor)
+  token   one token by its jti (logout)
+
+Entries expire with the tokens they cover (TTL index on expiresAt), so the
+collection stays small. Each worker keeps an immutable snapshot of it, replaced
+wholesale by a sync thread every REVOCATION_SYNC_SECONDS; is_revoked() is two
+dict lookups on that snapshot and never touches Mongo. Revocations made by this
+worker apply to it immediately, other workers see them after the next sync.
+If a sync fails the previous snapshot is kept.
+
+    REVOCATION_SYNC_SECONDS=5
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import pytz
+
+from db import revocations_col
+from auth import ACCESS_TOKEN_EXPIRE_MINUTES
+
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+class _Snapshot:
+    __slots__ = ("users", "tokens")
+
+    def __init__(self, users: dict, tokens: frozenset):
+        self.users = users    # user_id -> notBefore (epoch seconds)
+        self.tokens = tokens  # revoked jtis
+
+
+_snapshot = _Snapshot({}, frozenset())
+_lock = threading.Lock()   # serialises snapshot replacement, readers never take it
+_stop = threading.Event()
+_thread = None
+
+
+def is_revoked(payload: dict) -> bool:
+    snapshot = _snapshot
+    not_before = snapshot.users.get(payload.get("user_id"))
+    # Tokens minted before iat was added count as issued at 0
+    if not_before is not None and payload.get("iat", 0) < not_before:
+        return True
+    jti = payload.get("jti")
+    return jti is not None and jti in snapshot.tokens
+
+
+def _apply(users: dict = None, tokens=()):
+    global _snapshot
+    with _lock:
+        merged = dict(_snapshot.users)
+        for user_id, not_before in (users or {}).items():
+            merged[user_id] = max(not_before, merged.get(user_id, 0))
+        _snapshot = _Snapshot(merged, _snapshot.tokens | frozenset(tokens))
+
+
+def revoke_user(user_id, reason: str = ""):
+    """Invalidate every token of this user issued until now; later logins are not affected"""
+    now = time.time()
+    user_id = str(user_id)
+    revocations_col.update_one(
+        {"_id": f"user:{user_id}"},
+        {"$set": {
+            "kind": "user",
+            "userId": user_id,
+            "notBefore": now,
+            "reason": reason,
+            # Every token it covers has expired by then
+            "expiresAt": datetime.now(pytz.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+        }},
+        upsert=True
+    )
+    _apply(users={user_id: now})
+
+
+def revoke_token(payload: dict, reason: str = ""):
+    """Invalidate one token (by jti) until it expires"""
+    jti = payload.get("jti")
+    if not jti:
+        return
+    revocations_col.update_one(
+        {"_id": f"token:{jti}"},
+        {"$set": {
+            "kind": "token",
+            "jti": jti,
+            "userId": payload.get("user_id"),
+            "reason": reason,
+            "expiresAt": datetime.fromtimestamp(payload["exp"], pytz.utc),
+        }},
+        upsert=True
+    )
+    _apply(tokens=(jti,))
+
+
+def sync():
+    """Replace the snapshot with the collection's current (unexpired) entries"""
+    global _snapshot
+    users, tokens = {}, set()
+    # The TTL monitor runs once a minute, so expired entries are filtered here too
+    for doc in revocations_col.find({"expiresAt": {"$gt": datetime.now(pytz.utc)}},
+                                    {"kind": 1, "userId": 1, "notBefore": 1, "jti": 1}):
+        if doc.get("kind") == "user":
+            users[doc["userId"]] = doc["notBefore"]
+        elif doc.get("kind") == "token":
+            tokens.add(doc["jti"])
+    with _lock:
+        _snapshot = _Snapshot(users, frozenset(tokens))
+
+
+def _run():
+    while True:
+        try:
+            sync()
+        except Exception:
+            logger.exception("Revocation sync failed, keeping the previous snapshot")
+        if _stop.wait(REVOCATION_SYNC_SECONDS):
+            return
+
+
+def start():
+    """Start the sync thread of this worker"""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="revocation-sync", daemon=True)
+    _thread.start()
+
+
+def stop():
+    _stop.set()
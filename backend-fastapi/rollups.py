@@ -0,0 +1,201 @@
+"""
+Pre-aggregated clinical statistics for hospital admins.
+
+Three rollup collections hold one document per time bucket (IST day):
+
+    rollup_diagnoses     hospital, day, diagnosis   -> count
+    rollup_medicines     hospital, day, medicine    -> count
+    rollup_appointments  hospital, doctor, day      -> total and count per status
+
+Write routes keep them current with $inc upserts; the analytics endpoints only
+read buckets. The backfill rebuilds them from both tiers (hot and archive) and
+is safe to re-run, e.g. after a deploy or to repair drift. Buckets are replaced
+whole, so run it when writes are quiet:
+
+    python rollups.py
+"""
+import logging
+import argparse
+from datetime import datetime
+
+import pytz
+from pymongo import UpdateOne
+
+from db import (
+    prescriptions_col, appointments_col, prescriptions_archive_col, appointments_archive_col,
+    rollup_diagnoses_col, rollup_medicines_col, rollup_appointments_col,
+)
+
+IST = pytz.timezone("Asia/Kolkata")
+logger = logging.getLogger(__name__)
+
+
+def day_of(moment: datetime) -> str:
+    # Mongo returns naive UTC datetimes
+    if moment.tzinfo is None:
+        moment = pytz.utc.localize(moment)
+    return moment.astimezone(IST).strftime("%Y-%m-%d")
+
+
+def _label(value: str) -> str:
+    # Same normalisation as the backfill's $trim/$toLower
+    return str(value).strip().lower()
+
+
+##------------------- Incremental updates -------------------##
+
+def record_prescription(prescription: dict):
+    """Count a new doctor prescription. Self-reported uploads belong to no hospital and are skipped."""
+    hospital_id = prescription.get("hospitalId")
+    if not hospital_id:
+        return
+    day = day_of(prescription["createdAt"])
+
+    try:
+        diagnosis = _label(prescription.get("diagnosis") or "")
+        if diagnosis:
+            rollup_diagnoses_col.update_one(
+                {"_id": {"hospitalId": hospital_id, "day": day, "diagnosis": diagnosis}},
+                {"$inc": {"count": 1}, "$setOnInsert": {"hospitalId": hospital_id, "day": day, "diagnosis": diagnosis}},
+                upsert=True
+            )
+
+        medicines = {_label(m["name"]) for m in prescription.get("medicines", []) if m.get("name")}
+        if medicines:
+            rollup_medicines_col.bulk_write([
+                UpdateOne(
+                    {"_id": {"hospitalId": hospital_id, "day": day, "medicine": name}},
+                    {"$inc": {"count": 1}, "$setOnInsert": {"hospitalId": hospital_id, "day": day, "medicine": name}},
+                    upsert=True
+                )
+                for name in medicines
+            ], ordered=False)
+    except Exception:
+        # Rollups are derived data: never fail the write over them, the backfill repairs drift
+        logger.exception("Prescription rollup update failed")
+
+
+def record_appointment_status(appointment: dict, old_status: str = None, new_status: str = None):
+    """
+    Move one appointment between status counters of its doctor/day bucket.
+    old_status=None means a new appointment (also counted in total).
+    `appointment` needs hospitalId, doctorId and slot.
+    """
+    day = day_of(appointment["slot"])
+    hospital_id, doctor_id = appointment["hospitalId"], appointment["doctorId"]
+
+    inc = {}
+    if old_status is None:
+        inc["total"] = 1
+    else:
+        inc[f"status.{old_status}"] = -1
+    if new_status:
+        inc[f"status.{new_status}"] = inc.get(f"status.{new_status}", 0) + 1
+    if not any(inc.values()):
+        return
+
+    try:
+        rollup_appointments_col.update_one(
+            {"_id": {"hospitalId": hospital_id, "doctorId": doctor_id, "day": day}},
+            {"$inc": inc, "$setOnInsert": {"hospitalId": hospital_id, "doctorId": doctor_id, "day": day}},
+            upsert=True
+        )
+    except Exception:
+        logger.exception("Appointment rollup update failed")
+
+
+##------------------- Backfill -------------------##
+
+def _day_expr(field: str) -> dict:
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": field, "timezone": "Asia/Kolkata"}}
+
+
+def _over_both_tiers(hot, cold, pipeline: list, target: str):
+    # $unionWith pulls in the archive so archived history keeps its buckets
+    hot.aggregate(
+        [{"$unionWith": {"coll": cold.name}}] + pipeline
+        + [{"$merge": {"into": target, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}],
+        allowDiskUse=True
+    )
+
+
+def backfill():
+    doctor_prescriptions = {"$match": {"hospitalId": {"$exists": True, "$ne": None}, "createdAt": {"$type": "date"}}}
+
+    _over_both_tiers(prescriptions_col, prescriptions_archive_col, [
+        doctor_prescriptions,
+        {"$project": {
+            "hospitalId": 1,
+            "day": _day_expr("$createdAt"),
+            "diagnosis": {"$toLower": {"$trim": {"input": {"$ifNull": ["$diagnosis", ""]}}}},
+        }},
+        {"$match": {"diagnosis": {"$ne": ""}}},
+        {"$group": {"_id": {"hospitalId": "$hospitalId", "day": "$day", "diagnosis": "$diagnosis"}, "count": {"$sum": 1}}},
+        {"$set": {"hospitalId": "$_id.hospitalId", "day": "$_id.day", "diagnosis": "$_id.diagnosis"}},
+    ], rollup_diagnoses_col.name)
+
+    _over_both_tiers(prescriptions_col, prescriptions_archive_col, [
+        doctor_prescriptions,
+        {"$unwind": "$medicines"},
+        {"$project": {
+            "hospitalId": 1,
+            "day": _day_expr("$createdAt"),
+            "medicine": {"$toLower": {"$trim": {"input": {"$ifNull": ["$medicines.name", ""]}}}},
+        }},
+        {"$match": {"medicine": {"$ne": ""}}},
+        # A medicine listed twice in one prescription counts once, as in record_prescription
+        {"$group": {"_id": {"rx": "$_id", "hospitalId": "$hospitalId", "day": "$day", "medicine": "$medicine"}}},
+        {"$group": {"_id": {"hospitalId": "$_id.hospitalId", "day": "$_id.day", "medicine": "$_id.medicine"}, "count": {"$sum": 1}}},
+        {"$set": {"hospitalId": "$_id.hospitalId", "day": "$_id.day", "medicine": "$_id.medicine"}},
+    ], rollup_medicines_col.name)
+
+    _over_both_tiers(appointments_col, appointments_archive_col, [
+        {"$match": {"slot": {"$type": "date"}, "status": {"$type": "string"}}},
+        {"$group": {
+            "_id": {"hospitalId": "$hospitalId", "doctorId": "$doctorId", "day": _day_expr("$slot"), "status": "$status"},
+            "n": {"$sum": 1},
+        }},
+        {"$group": {
+            "_id": {"hospitalId": "$_id.hospitalId", "doctorId": "$_id.doctorId", "day": "$_id.day"},
+            "total": {"$sum": "$n"},
+            "status": {"$push": {"k": "$_id.status", "v": "$n"}},
+        }},
+        {"$set": {
+            "status": {"$arrayToObject": "$status"},
+            "hospitalId": "$_id.hospitalId", "doctorId": "$_id.doctorId", "day": "$_id.day",
+        }},
+    ], rollup_appointments_col.name)
+
+
+##------------------- Reads -------------------##
+
+def top_counts(col, hospital_id: str, start_day: str, end_day: str, field: str, limit: int) -> list:
+    """Sum the day buckets of a range and return the `limit` largest"""
+    return [
+        {"name": row["_id"], "count": row["count"]}
+        for row in col.aggregate([
+            {"$match": {"hospitalId": hospital_id, "day": {"$gte": start_day, "$lte": end_day}}},
+            {"$group": {"_id": f"${field}", "count": {"$sum": "$count"}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": limit},
+        ])
+    ]
+
+
+def appointment_buckets(hospital_id: str, start_day: str, end_day: str, doctor_id=None) -> list:
+    query = {"hospitalId": hospital_id, "day": {"$gte": start_day, "$lte": end_day}}
+    if doctor_id is not None:
+        query["doctorId"] = doctor_id
+    return list(rollup_appointments_col.find(query, {"_id": 0}).sort([("day", 1), ("doctorId", 1)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+    backfill()
+    for col in (rollup_diagnoses_col, rollup_medicines_col, rollup_appointments_col):
+        print(f"{col.name}: {col.estimated_document_count()} buckets")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException
-from db import users_col, hospitals_col
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from datetime import date, datetime, timedelta
+from typing import Optional
+import pytz
+from db import users_col, rollup_diagnoses_col, rollup_medicines_col
+from hospital_registry import hospital_registry
 from jose import jwt
 from auth import SECRET_KEY, ALGORITHM
 from bson import ObjectId
 from fastapi.security import OAuth2PasswordBearer
+from security import Identity
+from revocation import is_revoked, revoke_user
+from singleflight import public_reads
+from versions import conditional_get, get_versions, bump, hospital_scope, HOSPITALS_SCOPE
+from rollups import top_counts, appointment_buckets
 
 # 1. Setup Router & Security
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login/hospital-admin")
 router = APIRouter(prefix="/hospital-admin", tags=["Hospital Admin"])
+IST = pytz.timezone("Asia/Kolkata")
 
-def admin_guard(token: str = Depends(oauth2_scheme)):
+def admin_guard(token: str = Depends(oauth2_scheme)) -> Identity:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        if payload["role"] != "HOSPITAL_ADMIN":
+        if payload["role"] != "HOSPITAL_ADMIN" or is_revoked(payload):
             raise HTTPException(403, "Access denied")
-        return payload
+        return Identity.from_claims(payload)
     except Exception:
         raise HTTPException(401, "Invalid token")
 
+def _admin_hospital_id(admin: Identity, required: bool = True) -> Optional[str]:
+    """The admin's hospital from the token claim; only tokens without scope claims cost a lookup"""
+    hospital_id = admin.hospital_id
+    if not admin.has_scope_claims:
+        admin_user = users_col.find_one({"_id": ObjectId(admin.user_id)}, {"hospitalId": 1})
+        if not admin_user:
+            raise HTTPException(404, "Admin user not found")
+        hospital_id = admin_user.get("hospitalId")
+    if required and not hospital_id:
+        raise HTTPException(400, "Admin is not linked to any hospital")
+    return hospital_id
+
 # 2. Dashboard Stats Route
 @router.get("/overview")
-def get_hospital_overview(admin_payload=Depends(admin_guard)):
+def get_hospital_overview(request: Request, response: Response, admin=Depends(admin_guard)):
     
-    # Get Admin User
-    admin_id = admin_payload["user_id"]
-    admin_user = users_col.find_one({"_id": ObjectId(admin_id)})
-    
-    if not admin_user:
-        raise HTTPException(404, "Admin user not found")
-        
-    hospital_id = admin_user.get("hospitalId") 
-    
-    if not hospital_id:
-        raise HTTPException(400, "Admin is not linked to any hospital")
+    # Admin's Hospital ID (token claim)
+    hospital_id = _admin_hospital_id(admin)
+
+    # Hospital details come from the registry snapshot, so its version goes into the ETag
+    snapshot = hospital_registry.snapshot()
+    versions = {**get_versions(hospital_scope(hospital_id)), HOSPITALS_SCOPE: snapshot.version}
+    not_modified = conditional_get(request, response, HOSPITALS_SCOPE, hospital_scope(hospital_id), versions=versions)
+    if not_modified:
+        return not_modified
 
     # Fetch Hospital Details
-    hospital_data = hospitals_col.find_one({"hospitalId": hospital_id})
+    hospital_data = snapshot.get(hospital_id)
     
     if not hospital_data:
         raise HTTPException(404, f"Hospital details not found for ID '{hospital_id}'")
@@ -57,16 +77,18 @@ def get_hospital_overview(admin_payload=Depends(admin_guard)):
 
 # 3. Get All Doctors (Pending & Approved)
 @router.get("/doctors")
-def get_all_doctors(admin_payload=Depends(admin_guard)):
+def get_all_doctors(request: Request, response: Response, admin=Depends(admin_guard)):
     
-    # Get Admin's Hospital ID
-    admin_id = admin_payload["user_id"]
-    admin_user = users_col.find_one({"_id": ObjectId(admin_id)})
-    hospital_id = admin_user.get("hospitalId")
+    # Get Admin's Hospital ID (token claim)
+    hospital_id = _admin_hospital_id(admin, required=False)
     
     if not hospital_id:
         return []
 
+    not_modified = conditional_get(request, response, hospital_scope(hospital_id))
+    if not_modified:
+        return not_modified
+
     # Fetch doctors that are either PENDING or APPROVED
     doctors = list(users_col.find(
         {
@@ -85,16 +107,14 @@ def get_all_doctors(admin_payload=Depends(admin_guard)):
 
 # 4. Approve Doctor
 @router.post("/approve/{doctor_id}")
-def approve_doctor(doctor_id: str, admin_payload=Depends(admin_guard)):
+def approve_doctor(doctor_id: str, admin=Depends(admin_guard)):
     try:
         oid = ObjectId(doctor_id)
     except:
         raise HTTPException(400, "Invalid Doctor ID format")
 
     # Security: Get Admin's Hospital ID to ensure we only approve OUR doctors
-    admin_id = admin_payload["user_id"]
-    admin_user = users_col.find_one({"_id": ObjectId(admin_id)})
-    hospital_id = admin_user.get("hospitalId")
+    hospital_id = _admin_hospital_id(admin, required=False)
 
     result = users_col.update_one(
         {
@@ -108,20 +128,22 @@ def approve_doctor(doctor_id: str, admin_payload=Depends(admin_guard)):
     if result.matched_count == 0:
         raise HTTPException(404, "Doctor not found or belongs to another hospital")
 
+    # The public doctor list of this hospital changed
+    public_reads.forget(f"hospital-doctors:{hospital_id}")
+    bump(hospital_scope(hospital_id))
+
     return {"message": "Doctor approved successfully"}
 
 # 5. Reject Doctor (New Route)
 @router.post("/reject/{doctor_id}")
-def reject_doctor(doctor_id: str, admin_payload=Depends(admin_guard)):
+def reject_doctor(doctor_id: str, admin=Depends(admin_guard)):
     try:
         oid = ObjectId(doctor_id)
     except:
         raise HTTPException(400, "Invalid Doctor ID format")
 
     # Security: Get Admin's Hospital ID
-    admin_id = admin_payload["user_id"]
-    admin_user = users_col.find_one({"_id": ObjectId(admin_id)})
-    hospital_id = admin_user.get("hospitalId")
+    hospital_id = _admin_hospital_id(admin, required=False)
 
     # Update status to REJECTED
     result = users_col.update_one(
@@ -136,4 +158,89 @@ def reject_doctor(doctor_id: str, admin_payload=Depends(admin_guard)):
     if result.matched_count == 0:
         raise HTTPException(404, "Doctor not found or belongs to another hospital")
 
-    return {"message": "Doctor rejected/revoked successfully"}
\ No newline at end of file
+    # Tokens the doctor already holds stop working now, not when they expire
+    revoke_user(doctor_id, reason=f"Rejected by hospital admin of {hospital_id}")
+
+    # The public doctor list of this hospital changed
+    public_reads.forget(f"hospital-doctors:{hospital_id}")
+    bump(hospital_scope(hospital_id))
+
+    return {"message": "Doctor rejected/revoked successfully"}
+
+# 6. Analytics (read pre-aggregated day buckets only, see rollups.py)
+def _day_range(start: Optional[date], end: Optional[date]):
+    # Defaults to the last 30 days, IST
+    end = end or datetime.now(IST).date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(400, "start must not be after end")
+    return start.isoformat(), end.isoformat()
+
+@router.get("/analytics/diagnoses")
+def get_top_diagnoses(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(10, ge=1, le=100),
+    admin=Depends(admin_guard)
+):
+    hospital_id = _admin_hospital_id(admin)
+    start_day, end_day = _day_range(start, end)
+    return {
+        "start": start_day,
+        "end": end_day,
+        "diagnoses": top_counts(rollup_diagnoses_col, hospital_id, start_day, end_day, "diagnosis", limit)
+    }
+
+@router.get("/analytics/medicines")
+def get_top_medicines(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(10, ge=1, le=100),
+    admin=Depends(admin_guard)
+):
+    hospital_id = _admin_hospital_id(admin)
+    start_day, end_day = _day_range(start, end)
+    return {
+        "start": start_day,
+        "end": end_day,
+        "medicines": top_counts(rollup_medicines_col, hospital_id, start_day, end_day, "medicine", limit)
+    }
+
+@router.get("/analytics/appointments")
+def get_appointment_volume(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    doctorId: Optional[str] = None,
+    admin=Depends(admin_guard)
+):
+    """Appointments per doctor per day, with the count in each status"""
+    hospital_id = _admin_hospital_id(admin)
+    start_day, end_day = _day_range(start, end)
+    try:
+        doctor_oid = ObjectId(doctorId) if doctorId else None
+    except Exception:
+        raise HTTPException(400, "Invalid Doctor ID format")
+
+    buckets = appointment_buckets(hospital_id, start_day, end_day, doctor_oid)
+
+    # One lookup for the names of every doctor in the range
+    names = {
+        doc["_id"]: doc.get("name", "Unknown Doctor")
+        for doc in users_col.find({"_id": {"$in": list({b["doctorId"] for b in buckets})}}, {"name": 1})
+    }
+
+    return {
+        "start": start_day,
+        "end": end_day,
+        "buckets": [
+            {
+                "day": b["day"],
+                "doctorId": str(b["doctorId"]),
+                "doctorName": names.get(b["doctorId"], "Unknown Doctor"),
+                "total": b.get("total", 0),
+                # Transitions can leave zero counters behind
+                "status": {k: v for k, v in b.get("status", {}).items() if v}
+            }
+            for b in buckets
+        ]
+    }
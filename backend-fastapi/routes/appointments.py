@@ -1,17 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from datetime import datetime
+from typing import Optional
 import pytz
 from bson import ObjectId
-# Import hospitals_col to fetch hospital names
-from db import users_col, appointments_col, hospitals_col 
+from db import users_col, appointments_col
+# Hospital names and locations come from the in-memory registry
+from hospital_registry import hospital_registry
 from models import AppointmentRequest
 from security import patient_guard, doctor_guard
+from singleflight import public_reads
+from cache import cached, invalidate, PATIENT_APPOINTMENTS, DOCTOR_APPOINTMENTS
+from availability import availability_index
+from scheduler import appointment_scheduler
+from archive import tiered_find
+from db import appointments_archive_col
+from versions import conditional_get, get_versions, bump, user_scope, hospital_scope
+from rollups import record_appointment_status
+from consistency import causal_session, replica
+from fieldsets import (
+    parse_fields, projection, variant,
+    APPOINTMENT_FIELDS, PATIENT_APPOINTMENT_LOOKUPS, DOCTOR_APPOINTMENT_LOOKUPS,
+)
 
 router = APIRouter(prefix="/appointments", tags=["Appointments"])
 IST = pytz.timezone("Asia/Kolkata")
 
 @router.get("/hospitals/{hospital_id}/doctors")
-def get_doctors_by_hospital(hospital_id: str):
+def get_doctors_by_hospital(hospital_id: str, request: Request, response: Response):
+    # The version lookup is coalesced with the read: concurrent callers share both round trips
+    versions, doctors = public_reads.do(f"hospital-doctors:{hospital_id}", lambda: _load_hospital_doctors(hospital_id))
+    not_modified = conditional_get(request, response, hospital_scope(hospital_id), private=False, versions=versions)
+    if not_modified:
+        return not_modified
+    return doctors
+
+def _load_hospital_doctors(hospital_id: str):
+    # Version first: the ETag can only be older than the list it comes with
+    versions = get_versions(hospital_scope(hospital_id))
     doctors = list(users_col.find(
         {"hospitalId": hospital_id, "role": "DOCTOR", "status": "APPROVED"},
         {"passwordHash": 0}
@@ -20,52 +45,119 @@ def get_doctors_by_hospital(hospital_id: str):
     for doc in doctors:
         doc["_id"] = str(doc["_id"])
         
-    return doctors
+    return versions, doctors
+
+@router.get("/availability")
+def get_availability(
+    hospitalId: Optional[str] = None,
+    specialization: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+    after: Optional[datetime] = None
+):
+    """Earliest free slots across the approved doctors of a hospital and/or specialization"""
+    if not hospitalId and not specialization:
+        raise HTTPException(400, "hospitalId or specialization is required")
+
+    query = {"role": "DOCTOR", "status": "APPROVED"}
+    if hospitalId:
+        query["hospitalId"] = hospitalId
+    if specialization:
+        query["specialization"] = specialization
+
+    # One roster query, the slot search itself runs on the in-memory index
+    doctors = {
+        str(doc["_id"]): doc
+        for doc in users_col.find(query, {"name": 1, "specialization": 1, "hospitalId": 1})
+    }
+
+    slots = availability_index.earliest_free(doctors.keys(), limit, after)
+
+    return [
+        {
+            "doctorId": doctor_id,
+            "doctorName": doctors[doctor_id].get("name", "Unknown Doctor"),
+            "specialization": doctors[doctor_id].get("specialization", "General Physician"),
+            "hospitalId": doctors[doctor_id].get("hospitalId"),
+            "slot": slot
+        }
+        for slot, doctor_id in slots
+    ]
 
 @router.get("/patient")
-def get_my_appointments(user=Depends(patient_guard)):
+def get_my_appointments(request: Request, response: Response, include_archive: bool = False,
+                        fields: Optional[str] = None, user=Depends(patient_guard)):
     """Fetch appointments AND look up details + coordinates"""
-    
-    appointments = list(appointments_col.find(
-        {"patientId": ObjectId(user["user_id"])},
-        {"_id": 1, "doctorId": 1, "hospitalId": 1, "slot": 1, "status": 1, "patientId": 1}
-    ).sort("slot", -1)) 
+    patient_id = user["user_id"]
+    fieldset = parse_fields(fields, APPOINTMENT_FIELDS | PATIENT_APPOINTMENT_LOOKUPS.keys())
+    with causal_session(patient_id) as session:
+        scope = user_scope(patient_id)
+        versions = get_versions(scope, session=session)
+        not_modified = conditional_get(request, response, scope, session=session, versions=versions)
+        if not_modified:
+            return not_modified
+        if include_archive:
+            # Archive reads are rare, only the hot-tier view is cached
+            return _load_patient_appointments(patient_id, include_archive=True, session=session, fieldset=fieldset)
+        return cached(PATIENT_APPOINTMENTS, patient_id,
+                      lambda: _load_patient_appointments(patient_id, session=session, fieldset=fieldset),
+                      variant=variant(fieldset), version=versions[scope])
+
+def _load_patient_appointments(patient_id: str, include_archive: bool = False, session=None, fieldset=None):
+    # Lookups run only for the looked-up fields that were asked for, and need their key field
+    lookups = {"doctor", "hospital"} if fieldset is None else {PATIENT_APPOINTMENT_LOOKUPS[f] for f in fieldset & PATIENT_APPOINTMENT_LOOKUPS.keys()}
+    keys = {"doctor": "doctorId", "hospital": "hospitalId"}
+    appointments = tiered_find(
+        replica(appointments_col), replica(appointments_archive_col), include_archive,
+        {"patientId": ObjectId(patient_id)},
+        projection(
+            fieldset & APPOINTMENT_FIELDS if fieldset is not None else None,
+            default={"_id": 1, "doctorId": 1, "hospitalId": 1, "slot": 1, "status": 1, "patientId": 1},
+            extra=[keys[l] for l in lookups]
+        ),
+        sort=("slot", -1),
+        session=session
+    )
 
     for apt in appointments:
         apt["_id"] = str(apt["_id"])
-        apt["patientId"] = str(apt["patientId"])
+        if "patientId" in apt:
+            apt["patientId"] = str(apt["patientId"])
         
         # Timezone fix
         if apt.get("slot") and apt["slot"].tzinfo is None:
              apt["slot"] = pytz.utc.localize(apt["slot"])
         
         # Doctor Lookup
-        doc = users_col.find_one({"_id": apt["doctorId"]}, {"name": 1, "specialization": 1, "wallet_address": 1})
-        if doc:
-            apt["doctorName"] = doc.get("name", "Unknown Doctor")
-            apt["specialization"] = doc.get("specialization", "General Physician")
-            apt["doctorWallet"] = doc.get("wallet_address", "")
-        else:
-            apt["doctorName"] = "Unknown"
-            apt["specialization"] = "N/A"
+        if "doctor" in lookups:
+            doc = replica(users_col).find_one({"_id": apt["doctorId"]}, {"name": 1, "specialization": 1, "wallet_address": 1}, session=session)
+            if doc:
+                apt["doctorName"] = doc.get("name", "Unknown Doctor")
+                apt["specialization"] = doc.get("specialization", "General Physician")
+                apt["doctorWallet"] = doc.get("wallet_address", "")
+            else:
+                apt["doctorName"] = "Unknown"
+                apt["specialization"] = "N/A"
         
-        apt["doctorId"] = str(apt["doctorId"])
+        if "doctorId" in apt:
+            apt["doctorId"] = str(apt["doctorId"])
 
-        # Hospital Lookup (FETCH LOCATION)
-        hosp = hospitals_col.find_one(
-            {"hospitalId": apt["hospitalId"]}, 
-            {"hospitalName": 1, "city": 1, "location": 1} # <--- Request location
-        )
-        
-        if hosp:
-            apt["hospitalName"] = hosp.get("hospitalName", "Unknown Hospital")
-            apt["hospitalCity"] = hosp.get("city", "")
-            # MongoDB GeoJSON is [long, lat]
-            apt["hospitalCoords"] = hosp.get("location", {}).get("coordinates") 
-        else:
-            apt["hospitalName"] = "Unknown Hospital"
-            apt["hospitalCity"] = ""
-            apt["hospitalCoords"] = None
+        # Hospital Lookup (FETCH LOCATION), a dict read
+        if "hospital" in lookups:
+            hosp = hospital_registry.get(apt["hospitalId"])
+            
+            if hosp:
+                apt["hospitalName"] = hosp.get("hospitalName", "Unknown Hospital")
+                apt["hospitalCity"] = hosp.get("city", "")
+                # MongoDB GeoJSON is [long, lat]
+                apt["hospitalCoords"] = hosp.get("location", {}).get("coordinates") 
+            else:
+                apt["hospitalName"] = "Unknown Hospital"
+                apt["hospitalCity"] = ""
+                apt["hospitalCoords"] = None
+
+    if fieldset is not None:
+        # Drop the key fields that were only fetched for the lookups
+        appointments = [{k: v for k, v in apt.items() if k == "_id" or k in fieldset} for apt in appointments]
 
     return appointments
 
@@ -105,52 +197,141 @@ def request_appointment(data: AppointmentRequest, user=Depends(patient_guard)):
         "createdAt": datetime.now(IST)
     }
 
-    appointments_col.insert_one(appointment)
+    with causal_session(user["user_id"], data.doctorId) as session:
+        appointments_col.insert_one(appointment, session=session)
+        bump(user_scope(user["user_id"]), user_scope(data.doctorId), session=session)
+    availability_index.book(data.doctorId, slot_ist)
+    record_appointment_status(appointment, None, "REQUESTED")
+    # Expires unless the doctor accepts before the slot starts
+    appointment_scheduler.schedule_expiry(appointment["_id"], slot_ist)
+
+    # Drop the cached dashboards of both sides
+    invalidate(user["user_id"], PATIENT_APPOINTMENTS)
+    invalidate(data.doctorId, DOCTOR_APPOINTMENTS)
 
     return {"message": "Appointment requested successfully", "slot": slot_ist}
 
 
+def _transition_failed(query: dict, session=None):
+    """A status update matched nothing: 404 if the appointment isn't the caller's, 409 if its status forbids it"""
+    current = appointments_col.find_one(query, {"status": 1}, session=session)
+    if current is None:
+        raise HTTPException(404, "Appointment not found")
+    raise HTTPException(409, f"Appointment is {current['status']}")
+
+
 @router.post("/doctor/{appointment_id}/accept")
 def accept_appointment(appointment_id: str, user=Depends(doctor_guard)):
-    result = appointments_col.update_one(
-        {"_id": ObjectId(appointment_id), "doctorId": ObjectId(user["user_id"])},
-        {"$set": {"status": "ACCEPTED"}}
-    )
+    with causal_session(user["user_id"]) as session:
+        appointment = appointments_col.find_one_and_update(
+            # Only a pending request can be accepted, not a cancelled or expired one
+            {"_id": ObjectId(appointment_id), "doctorId": ObjectId(user["user_id"]), "status": "REQUESTED"},
+            {"$set": {"status": "ACCEPTED"}},
+            # The pre-update document: its status is the one the rollup moves away from
+            projection={"patientId": 1, "doctorId": 1, "hospitalId": 1, "slot": 1, "status": 1},
+            session=session
+        )
 
-    if result.matched_count == 0:
-        raise HTTPException(404, "Appointment not found")
+        if appointment is None:
+            _transition_failed({"_id": ObjectId(appointment_id), "doctorId": ObjectId(user["user_id"])}, session)
+
+        bump(user_scope(user["user_id"]), user_scope(appointment["patientId"]), session=session)
+
+    availability_index.book(user["user_id"], appointment["slot"])
+    record_appointment_status(appointment, appointment.get("status"), "ACCEPTED")
+    appointment_scheduler.schedule_reminder(appointment["_id"], appointment["slot"])
+    invalidate(user["user_id"], DOCTOR_APPOINTMENTS)
+    invalidate(str(appointment["patientId"]), PATIENT_APPOINTMENTS)
 
     return {"message": "Appointment accepted"}
 
+
+@router.post("/{appointment_id}/cancel")
+def cancel_appointment(appointment_id: str, user=Depends(patient_guard)):
+    with causal_session(user["user_id"]) as session:
+        appointment = appointments_col.find_one_and_update(
+            {
+                "_id": ObjectId(appointment_id),
+                "patientId": ObjectId(user["user_id"]),
+                "status": {"$in": ["REQUESTED", "ACCEPTED"]}
+            },
+            {"$set": {"status": "CANCELLED"}},
+            projection={"doctorId": 1, "hospitalId": 1, "slot": 1, "status": 1},
+            session=session
+        )
+
+        if appointment is None:
+            _transition_failed({"_id": ObjectId(appointment_id), "patientId": ObjectId(user["user_id"])}, session)
+
+        bump(user_scope(user["user_id"]), user_scope(appointment["doctorId"]), session=session)
+
+    # The slot is free again
+    availability_index.release(appointment["doctorId"], appointment["slot"])
+    record_appointment_status(appointment, appointment["status"], "CANCELLED")
+    invalidate(user["user_id"], PATIENT_APPOINTMENTS)
+    invalidate(str(appointment["doctorId"]), DOCTOR_APPOINTMENTS)
+
+    return {"message": "Appointment cancelled"}
+
 @router.get("/doctor/my-appointments")
-def get_doctor_appointments(user=Depends(doctor_guard)):
+def get_doctor_appointments(request: Request, response: Response, include_archive: bool = False,
+                            fields: Optional[str] = None, user=Depends(doctor_guard)):
     """Fetch all appointments for the logged-in DOCTOR"""
-    
+    doctor_id = user["user_id"]
+    fieldset = parse_fields(fields, APPOINTMENT_FIELDS | DOCTOR_APPOINTMENT_LOOKUPS.keys())
+    with causal_session(doctor_id) as session:
+        scope = user_scope(doctor_id)
+        versions = get_versions(scope, session=session)
+        not_modified = conditional_get(request, response, scope, session=session, versions=versions)
+        if not_modified:
+            return not_modified
+        if include_archive:
+            return _load_doctor_appointments(doctor_id, include_archive=True, session=session, fieldset=fieldset)
+        return cached(DOCTOR_APPOINTMENTS, doctor_id,
+                      lambda: _load_doctor_appointments(doctor_id, session=session, fieldset=fieldset),
+                      variant=variant(fieldset), version=versions[scope])
+
+def _load_doctor_appointments(doctor_id: str, include_archive: bool = False, session=None, fieldset=None):
+    lookup_patient = fieldset is None or bool(fieldset & DOCTOR_APPOINTMENT_LOOKUPS.keys())
+
     # 1. Fetch appointments
-    appointments = list(appointments_col.find(
-        {"doctorId": ObjectId(user["user_id"])},
+    appointments = tiered_find(
+        replica(appointments_col), replica(appointments_archive_col), include_archive,
+        {"doctorId": ObjectId(doctor_id)},
         # FIX: Added "doctorId": 1 to this list
-        {"_id": 1, "patientId": 1, "hospitalId": 1, "slot": 1, "status": 1, "doctorId": 1}
-    ).sort("slot", 1)) 
+        projection(
+            fieldset & APPOINTMENT_FIELDS if fieldset is not None else None,
+            default={"_id": 1, "patientId": 1, "hospitalId": 1, "slot": 1, "status": 1, "doctorId": 1},
+            extra=["patientId"] if lookup_patient else []
+        ),
+        sort=("slot", 1),
+        session=session
+    )
 
     for apt in appointments:
         apt["_id"] = str(apt["_id"])
-        apt["doctorId"] = str(apt["doctorId"]) # Now this works
+        if "doctorId" in apt:
+            apt["doctorId"] = str(apt["doctorId"]) # Now this works
         
         # Timezone fix
         if apt.get("slot") and apt["slot"].tzinfo is None:
              apt["slot"] = pytz.utc.localize(apt["slot"])
 
         # 2. Enrich with PATIENT Name
-        patient = users_col.find_one({"_id": apt["patientId"]}, {"name": 1, "email": 1})
-        
-        if patient:
-            apt["patientName"] = patient.get("name", "Unknown Patient")
-            apt["patientEmail"] = patient.get("email", "")
-        else:
-            apt["patientName"] = "Unknown Patient"
-            apt["patientEmail"] = ""
+        if lookup_patient:
+            patient = replica(users_col).find_one({"_id": apt["patientId"]}, {"name": 1, "email": 1}, session=session)
+            
+            if patient:
+                apt["patientName"] = patient.get("name", "Unknown Patient")
+                apt["patientEmail"] = patient.get("email", "")
+            else:
+                apt["patientName"] = "Unknown Patient"
+                apt["patientEmail"] = ""
             
-        apt["patientId"] = str(apt["patientId"])
+        if "patientId" in apt:
+            apt["patientId"] = str(apt["patientId"])
 
-    return appointments
\ No newline at end of file
+    if fieldset is not None:
+        appointments = [{k: v for k, v in apt.items() if k == "_id" or k in fieldset} for apt in appointments]
+
+    return appointments
@@ -0,0 +1,132 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from bson import ObjectId
+import logging
+from db import prescriptions_col, prescriptions_archive_col
+from security import current_identity, patient_guard, Identity
+from versions import bump, user_scope
+from cache import invalidate, PATIENT_PRESCRIPTIONS, DOCTOR_PRESCRIPTIONS
+from blockchain_utils import blockchain_client
+from routes.prescriptions import _verify_doctor_access
+from attachments import (
+    storage, clean_filename, ATTACHMENT_MAX_BYTES, ATTACHMENT_TYPES, WRITE_BUFFER_BYTES, SHA256_RE,
+)
+
+# Attachments hang off prescriptions, see attachments.py for the storage
+router = APIRouter(prefix="/prescriptions", tags=["Attachments"])
+logger = logging.getLogger(__name__)
+
+
+def _object_id(value: str, what: str) -> ObjectId:
+    try:
+        return ObjectId(value)
+    except Exception:
+        raise HTTPException(400, f"Invalid {what} ID format")
+
+
+@router.post("/{prescription_id}/attachments")
+async def upload_attachment(
+    prescription_id: str,
+    request: Request,
+    filename: str = Query("attachment", max_length=255),
+    user=Depends(patient_guard)
+):
+    """
+    Attach a scan or PDF to one of the patient's own records.
+    Send the raw file as the body with its Content-Type; it is hashed and stored
+    while it streams in, and identical files are stored once.
+    """
+    oid = _object_id(prescription_id, "Prescription")
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in ATTACHMENT_TYPES:
+        raise HTTPException(415, f"Content-Type must be one of {', '.join(sorted(ATTACHMENT_TYPES))}")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > ATTACHMENT_MAX_BYTES:
+        raise HTTPException(413, f"Attachments are limited to {ATTACHMENT_MAX_BYTES // (1024 * 1024)} MB")
+
+    # 1. Check ownership before reading the body
+    prescription = await run_in_threadpool(
+        prescriptions_col.find_one, {"_id": oid, "patientId": ObjectId(user["user_id"])}, {"doctorId": 1}
+    )
+    if not prescription:
+        raise HTTPException(404, "Prescription not found")
+
+    # 2. Stream into storage, handing the blocking writes over in WRITE_BUFFER_BYTES pieces
+    writer = await run_in_threadpool(storage.writer)
+    pending = bytearray()
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > ATTACHMENT_MAX_BYTES:
+                raise HTTPException(413, f"Attachments are limited to {ATTACHMENT_MAX_BYTES // (1024 * 1024)} MB")
+            pending += chunk
+            if len(pending) >= WRITE_BUFFER_BYTES:
+                await run_in_threadpool(writer.write, bytes(pending))
+                pending.clear()
+        if not received:
+            raise HTTPException(400, "Empty attachment")
+        if pending:
+            await run_in_threadpool(writer.write, bytes(pending))
+        sha256, size, deduplicated = await run_in_threadpool(writer.commit)
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+
+    # 3. Link the content hash into the record
+    attachment = {
+        "sha256": sha256,
+        "filename": clean_filename(filename),
+        "contentType": content_type,
+        "size": size,
+    }
+    await run_in_threadpool(
+        prescriptions_col.update_one,
+        {"_id": oid},
+        {"$addToSet": {"attachments": attachment}}
+    )
+
+    # The record shows up in the patient's (and maybe the doctor's) list
+    doctor_id = prescription.get("doctorId")
+    scopes = [user_scope(user["user_id"])]
+    invalidate(user["user_id"], PATIENT_PRESCRIPTIONS)
+    if isinstance(doctor_id, ObjectId):
+        scopes.append(user_scope(doctor_id))
+        invalidate(str(doctor_id), DOCTOR_PRESCRIPTIONS)
+    await run_in_threadpool(bump, *scopes)
+
+    # Server side only: telling the uploader would reveal that someone else holds the same file
+    logger.info("Attachment stored", extra={"prescriptionId": prescription_id, "size": size, "deduplicated": deduplicated})
+    return attachment
+
+
+@router.get("/{prescription_id}/attachments/{sha256}")
+def download_attachment(prescription_id: str, sha256: str, request: Request,
+                        identity: Identity = Depends(current_identity)):
+    """
+    Stream an attachment (HTTP Range supported). The patient can always read it,
+    a doctor needs the patient's on-chain grant and the read is logged on-chain.
+    """
+    oid = _object_id(prescription_id, "Prescription")
+    if not SHA256_RE.match(sha256):
+        raise HTTPException(400, "Invalid attachment hash")
+
+    query = {"_id": oid, "attachments.sha256": sha256}
+    projection = {"patientId": 1, "attachments": {"$elemMatch": {"sha256": sha256}}}
+    prescription = prescriptions_col.find_one(query, projection) \
+        or prescriptions_archive_col.find_one(query, projection)
+    if not prescription:
+        raise HTTPException(404, "Attachment not found")
+
+    patient_id = str(prescription["patientId"])
+    if identity.role == "PATIENT":
+        if identity.user_id != patient_id:
+            raise HTTPException(404, "Attachment not found")
+    elif identity.role == "DOCTOR":
+        patient_wallet, doctor_wallet = _verify_doctor_access(identity, patient_id)
+        blockchain_client.submit_access_log(patient_wallet, doctor_wallet, f"View Attachment {sha256[:12]} of {patient_id}")
+    else:
+        raise HTTPException(403, "Patient or doctor access only")
+
+    attachment = prescription["attachments"][0]
+    return storage.response(sha256, attachment["contentType"], attachment["filename"], request.headers.get("range"))
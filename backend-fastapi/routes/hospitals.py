@@ -1,29 +1,47 @@
-from fastapi import APIRouter, HTTPException
-from db import hospitals_col
+from fastapi import APIRouter, HTTPException, Request, Response
+from typing import Optional
+from hospital_registry import hospital_registry, project
+from versions import conditional_get, HOSPITALS_SCOPE
+from fieldsets import parse_fields, HOSPITAL_FIELDS
 
 # Public route - anyone can see the list of hospitals
 router = APIRouter(prefix="/hospitals", tags=["Hospitals"])
 
 @router.get("/")
-def get_all_hospitals():
+def get_all_hospitals(request: Request, response: Response, fields: Optional[str] = None):
     """
     Fetch all hospitals. 
-    Used to populate dropdowns in the frontend.
+    Used to populate dropdowns in the frontend (?fields=hospitalId,hospitalName,city is all they need).
     """
+    fieldset = parse_fields(fields, HOSPITAL_FIELDS)
+    # The ETag carries the version of the snapshot the body comes from, not the live one
+    snapshot = hospital_registry.snapshot()
+    not_modified = conditional_get(request, response, HOSPITALS_SCOPE, private=False,
+                                   versions={HOSPITALS_SCOPE: snapshot.version})
+    if not_modified:
+        return not_modified
+
     # We exclude '_id' to return cleaner JSON, 
     # relying on your custom 'hospitalId' as the unique key.
-    hospitals = list(hospitals_col.find({}, {"_id": 0}))
-    
-    return hospitals
+    # Every patient opening the booking flow lands here: served from the registry snapshot,
+    # projected once per fieldset
+    return snapshot.listing(fieldset)
 
 @router.get("/{hospital_id}")
-def get_hospital_details(hospital_id: str):
+def get_hospital_details(hospital_id: str, request: Request, response: Response, fields: Optional[str] = None):
     """
     Get specific details (location, address) of one hospital.
     """
-    hospital = hospitals_col.find_one({"hospitalId": hospital_id}, {"_id": 0})
+    fieldset = parse_fields(fields, HOSPITAL_FIELDS)
+    snapshot = hospital_registry.snapshot()
+    not_modified = conditional_get(request, response, HOSPITALS_SCOPE, private=False,
+                                   versions={HOSPITALS_SCOPE: snapshot.version})
+    if not_modified:
+        return not_modified
+
+    hospital = snapshot.get(hospital_id)
     
     if not hospital:
         raise HTTPException(404, "Hospital not found")
         
-    return hospital
\ No newline at end of file
+    return project(hospital, fieldset)
\ No newline at end of file
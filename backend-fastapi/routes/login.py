@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from db import users_col
-from auth import verify_password, create_access_token
+from auth import verify_password, create_access_token, token_claims
 from models import LoginRequest
+from ratelimit import auth_admission
 
-router = APIRouter(tags=["Login"])
+# Every route here verifies an Argon2 hash, see ratelimit.auth_admission
+router = APIRouter(tags=["Login"], dependencies=[Depends(auth_admission)])
 
 @router.post("/login")
 def login(data: LoginRequest):
@@ -15,11 +17,7 @@ def login(data: LoginRequest):
     if user["role"] == "DOCTOR" and user["status"] != "APPROVED":
         raise HTTPException(403, "Doctor not approved yet")
 
-    token = create_access_token({
-        "user_id": str(user["_id"]),
-        "role": user["role"],
-        "name": user["name"]
-    })
+    token = create_access_token(token_claims(user))
 
     return {
         "access_token": token,
@@ -35,11 +33,7 @@ def login_hospital_admin(data: LoginRequest):
     if not user or not verify_password(data.password, user["passwordHash"]):
         raise HTTPException(401, "Invalid credentials")
 
-    token = create_access_token({
-        "user_id": str(user["_id"]),
-        "role": "HOSPITAL_ADMIN",
-        "name": user["name"]
-    })
+    token = create_access_token(token_claims(user, "HOSPITAL_ADMIN"))
 
     return {
         "access_token": token,
@@ -55,11 +49,7 @@ def login_system_admin(data: LoginRequest):
     if not user or not verify_password(data.password, user["passwordHash"]):
         raise HTTPException(401, "Invalid credentials")
 
-    token = create_access_token({
-        "user_id": str(user["_id"]),
-        "role": "SYSTEM_ADMIN",
-        "name": user["name"]
-    })
+    token = create_access_token(token_claims(user, "SYSTEM_ADMIN"))
 
     return {
         "access_token": token,
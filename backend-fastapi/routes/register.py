@@ -1,11 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime
 import pytz
 from db import users_col
 from auth import hash_password
 from models import PatientRegister, DoctorRegister, HospitalAdminRegister
+from ratelimit import auth_admission
+from versions import bump, hospital_scope
 
-router = APIRouter(prefix="/register", tags=["Register"])
+# Every route here computes an Argon2 hash, see ratelimit.auth_admission
+router = APIRouter(prefix="/register", tags=["Register"], dependencies=[Depends(auth_admission)])
 IST = pytz.timezone("Asia/Kolkata")
 
 @router.post("/patient")
@@ -52,6 +55,8 @@ def register_doctor(data: DoctorRegister):
     }
 
     users_col.insert_one(user)
+    # New pending approval on the hospital admin dashboard
+    bump(hospital_scope(data.hospitalId))
     return {"message": "Doctor registered. Await hospital admin approval."}
 
 @router.post("/hospital-admin")
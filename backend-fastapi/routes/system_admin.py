@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import codecs
+import logging
+from security import system_admin_guard
+from hospital_import import HospitalImport, FORMATS, IMPORT_BATCH_SIZE
+
+router = APIRouter(prefix="/system-admin", tags=["System Admin"])
+logger = logging.getLogger(__name__)
+
+# A registry line longer than this is not a hospital record, stop reading instead of buffering it
+MAX_LINE_CHARS = 64 * 1024
+
+
+async def _body_lines(request: Request):
+    """The request body as text lines, decoded chunk by chunk as it arrives"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    tail = ""
+    async for chunk in request.stream():
+        *lines, tail = (tail + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line
+        if len(tail) > MAX_LINE_CHARS:
+            raise ValueError(f"Line longer than {MAX_LINE_CHARS} characters")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+@router.post("/hospitals/import")
+async def import_hospitals(
+    request: Request,
+    format: Optional[str] = Query(None, description="csv | ndjson, default from Content-Type"),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=10000),
+    user=Depends(system_admin_guard)
+):
+    """
+    Upsert hospitals from a CSV or NDJSON registry sent as the request body (see hospital_import.py).
+    The body is parsed while it streams in and written in bulk batches, so memory stays flat
+    however large the registry is. Invalid rows are skipped and listed in the report.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv"
+    if format not in FORMATS:
+        raise HTTPException(400, f"format must be one of {', '.join(FORMATS)}")
+
+    job = HospitalImport(format, batch_size)
+    try:
+        async for line in _body_lines(request):
+            if job.add_line(line):
+                # pymongo blocks, keep the event loop free while the batch is written
+                await run_in_threadpool(job.write_batch)
+    except ValueError as e:  # includes UnicodeDecodeError
+        # Rows already written stay written; report them along with the error
+        report = await run_in_threadpool(job.finish)
+        raise HTTPException(400, {"error": f"Import stopped at line {job.line_no + 1}: {e}", "report": report})
+
+    report = await run_in_threadpool(job.finish)
+    logger.info("Hospital registry imported by %s", user["user_id"], extra={"format": format})
+    return report
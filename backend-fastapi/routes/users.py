@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from bson import ObjectId
-from db import users_col, hospitals_col
+from db import users_col
+from hospital_registry import hospital_registry
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -14,7 +15,7 @@ def get_doctor_details(doctor_id: str):
             raise HTTPException(404, "Doctor not found")
         
         # Get hospital details
-        hospital = hospitals_col.find_one({"hospitalId": doctor.get("hospitalId")})
+        hospital = hospital_registry.get(doctor.get("hospitalId"))
         
         return {
             "_id": str(doctor["_id"]),
@@ -33,20 +34,24 @@ from pydantic import BaseModel
 from fastapi import Depends
 from eth_account import Account
 from eth_account.messages import encode_defunct
-from security import get_current_user
+from pymongo import ReturnDocument
+from security import Identity, current_identity, get_current_user
+from revocation import revoke_token, revoke_user
+from auth import create_access_token, token_claims
 
 class WalletLinkRequest(BaseModel):
     walletAddress: str
     signature: str
 
 @router.post("/link-wallet")
-def link_wallet(data: WalletLinkRequest, user=Depends(get_current_user)):
+def link_wallet(data: WalletLinkRequest, identity: Identity = Depends(current_identity)):
     """
     Link a crypto wallet to the user account.
     Verifies that the signature matches 'Connect to E-Health: {user_id}'
+    Returns a fresh token; every earlier token of the user carries the previous wallet_address claim and is revoked.
     """
     try:
-        user_id = user["user_id"]
+        user_id = identity.user_id
         expected_msg = f"Connect to E-Health: {user_id}"
         message = encode_defunct(text=expected_msg)
         
@@ -57,18 +62,33 @@ def link_wallet(data: WalletLinkRequest, user=Depends(get_current_user)):
             raise HTTPException(400, "Signature verification failed. Wallet does not match signer.")
         
         # Update User in DB
-        result = users_col.update_one(
+        user_doc = users_col.find_one_and_update(
             {"_id": ObjectId(user_id)},
-            {"$set": {"wallet_address": recovered_address}}
+            {"$set": {"wallet_address": recovered_address}},
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.modified_count == 0:
-             # Check if already set to the same?
-             pass 
+        if not user_doc:
+            raise HTTPException(404, "User not found")
 
-        return {"message": "Wallet linked successfully", "wallet": recovered_address}
+        # Guards trust the wallet claim: no session may outlive the link with the old one.
+        # Revoked before minting, the new token's iat is past notBefore
+        revoke_user(user_id, reason="wallet-linked")
+        access_token = create_access_token(token_claims(user_doc, identity.role))
+
+        return {
+            "message": "Wallet linked successfully",
+            "wallet": recovered_address,
+            "access_token": access_token
+        }
 
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(500, f"Wallet linking failed: {str(e)}")
+
+@router.post("/logout")
+def logout(user=Depends(get_current_user)):
+    """Revoke the calling token on the server too, it is rejected from now on"""
+    revoke_token(user, reason="logout")
+    return {"message": "Logged out"}
@@ -0,0 +1,246 @@
+"""
+In-process scheduler for appointment expiry and reminders.
+
+One thread per worker pops a heap of (due, kind, appointment id):
+
+  expire   a REQUESTED appointment whose slot has started becomes EXPIRED
+  remind   an ACCEPTED appointment gets a reminder REMINDER_LEAD_MINUTES before its slot
+
+Only entries due in the next SCHEDULER_WINDOW_HOURS are held. The heap is filled by an
+indexed range scan on (status, slot) at start and again every half window; in between,
+the booking routes add entries that fall inside the loaded window. Slots sit on a fixed
+grid, so entries come due together and each kind is handled in one update_many per
+SCHEDULER_BATCH_SIZE ids. An entry that went stale (cancelled, accepted meanwhile) is
+simply not matched by the status filter of its update.
+
+Every worker runs a scheduler, so a batch can be attempted more than once. Each update
+stamps the documents it changed with its own batch id, and the side effects (rollups,
+availability, caches, reminder events) are applied only to those.
+
+    SCHEDULER_ENABLED=true
+    REMINDER_LEAD_MINUTES=60
+"""
+import os
+import time
+import uuid
+import heapq
+import logging
+import threading
+from datetime import datetime
+
+import pytz
+
+from db import appointments_col
+from availability import availability_index
+from cache import invalidate, PATIENT_APPOINTMENTS, DOCTOR_APPOINTMENTS
+from rollups import record_appointment_status
+from versions import bump, user_scope
+
+IST = pytz.timezone("Asia/Kolkata")
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+REMINDER_LEAD_MINUTES = int(os.getenv("REMINDER_LEAD_MINUTES", "60"))
+SCHEDULER_WINDOW_HOURS = float(os.getenv("SCHEDULER_WINDOW_HOURS", "6"))
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "500"))
+
+EXPIRE = "expire"
+REMIND = "remind"
+
+LEAD_SECONDS = REMINDER_LEAD_MINUTES * 60
+WINDOW_SECONDS = SCHEDULER_WINDOW_HOURS * 3600
+# A failed load is retried after this long instead of waiting for the next window
+LOAD_RETRY_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+def _epoch(slot: datetime) -> float:
+    # Mongo hands back naive datetimes that are UTC
+    if slot.tzinfo is None:
+        slot = pytz.utc.localize(slot)
+    return slot.timestamp()
+
+
+def _utc(epoch: float) -> datetime:
+    return datetime.fromtimestamp(epoch, pytz.utc)
+
+
+def log_reminder(appointment: dict):
+    logger.info("Appointment reminder", extra={
+        "appointmentId": str(appointment["_id"]),
+        "patientId": str(appointment["patientId"]),
+        "doctorId": str(appointment["doctorId"]),
+        "slot": _utc(_epoch(appointment["slot"])).isoformat(),
+    })
+
+
+##------------------- Batched transitions -------------------##
+
+def expire_batch(ids: list) -> int:
+    """REQUESTED -> EXPIRED for those of `ids` whose slot has started. Returns how many this call expired."""
+    batch_id = uuid.uuid4().hex
+    result = appointments_col.update_many(
+        {"_id": {"$in": ids}, "status": "REQUESTED", "slot": {"$lte": datetime.now(pytz.utc)}},
+        {"$set": {"status": "EXPIRED", "expiredAt": datetime.now(IST), "schedulerBatch": batch_id}}
+    )
+    if not result.modified_count:
+        return 0
+
+    expired = list(appointments_col.find(
+        {"_id": {"$in": ids}, "schedulerBatch": batch_id},
+        {"patientId": 1, "doctorId": 1, "hospitalId": 1, "slot": 1}
+    ))
+    scopes = []
+    for apt in expired:
+        record_appointment_status(apt, "REQUESTED", "EXPIRED")
+        availability_index.release(apt["doctorId"], apt["slot"])
+        invalidate(str(apt["patientId"]), PATIENT_APPOINTMENTS)
+        invalidate(str(apt["doctorId"]), DOCTOR_APPOINTMENTS)
+        scopes += [user_scope(apt["patientId"]), user_scope(apt["doctorId"])]
+    bump(*scopes)
+    return len(expired)
+
+
+def remind_batch(ids: list, handlers) -> int:
+    """Claim the reminders of `ids` not sent yet and pass each appointment to the handlers"""
+    batch_id = uuid.uuid4().hex
+    result = appointments_col.update_many(
+        {"_id": {"$in": ids}, "status": "ACCEPTED", "reminderSentAt": {"$exists": False}},
+        {"$set": {"reminderSentAt": datetime.now(IST), "schedulerBatch": batch_id}}
+    )
+    if not result.modified_count:
+        return 0
+
+    claimed = list(appointments_col.find(
+        {"_id": {"$in": ids}, "schedulerBatch": batch_id},
+        {"patientId": 1, "doctorId": 1, "hospitalId": 1, "slot": 1}
+    ))
+    for apt in claimed:
+        for handler in handlers:
+            try:
+                handler(apt)
+            except Exception:
+                logger.exception("Reminder handler failed")
+    return len(claimed)
+
+
+##------------------- Scheduler -------------------##
+
+class AppointmentScheduler:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []        # (due epoch, kind, appointment id)
+        self._queued = set()   # (kind, appointment id) in the heap
+        self._loaded_until = 0.0
+        self._stopping = False
+        self._thread = None
+        self._handlers = [log_reminder]
+
+    def on_reminder(self, handler):
+        """Register a callable(appointment) fired once per reminder, e.g. to send a notification"""
+        self._handlers.append(handler)
+        return handler
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="appointment-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        with self._cond:
+            self._stopping = True
+            self._loaded_until = 0.0
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def schedule_expiry(self, appointment_id, slot: datetime):
+        self._push(_epoch(slot), EXPIRE, appointment_id)
+
+    def schedule_reminder(self, appointment_id, slot: datetime):
+        self._push(_epoch(slot) - LEAD_SECONDS, REMIND, appointment_id)
+
+    def _push(self, due: float, kind: str, appointment_id):
+        with self._cond:
+            # Later entries are picked up by the load that reaches them; nothing is loaded when stopped
+            if due > self._loaded_until or (kind, appointment_id) in self._queued:
+                return
+            entry = (due, kind, appointment_id)
+            self._queued.add((kind, appointment_id))
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                # Due before whatever the thread is waiting for
+                self._cond.notify()
+
+    def _load(self, now: float):
+        until = now + WINDOW_SECONDS
+        with self._cond:
+            self._loaded_until = until
+
+        # Overdue requests are included, so a restart catches up on what it missed
+        for apt in appointments_col.find(
+            {"status": "REQUESTED", "slot": {"$lt": _utc(until)}}, {"slot": 1}
+        ):
+            self.schedule_expiry(apt["_id"], apt["slot"])
+
+        for apt in appointments_col.find(
+            {"status": "ACCEPTED", "slot": {"$gte": _utc(now), "$lt": _utc(until + LEAD_SECONDS)},
+             "reminderSentAt": {"$exists": False}},
+            {"slot": 1}
+        ):
+            self.schedule_reminder(apt["_id"], apt["slot"])
+
+    def _fire(self, due: list):
+        ids = {EXPIRE: [], REMIND: []}
+        for _, kind, appointment_id in due:
+            ids[kind].append(appointment_id)
+
+        for start in range(0, len(ids[EXPIRE]), SCHEDULER_BATCH_SIZE):
+            try:
+                expired = expire_batch(ids[EXPIRE][start:start + SCHEDULER_BATCH_SIZE])
+                if expired:
+                    logger.info("Expired %d appointment requests", expired)
+            except Exception:
+                # The next load picks the overdue requests up again
+                logger.exception("Appointment expiry batch failed")
+
+        for start in range(0, len(ids[REMIND]), SCHEDULER_BATCH_SIZE):
+            try:
+                remind_batch(ids[REMIND][start:start + SCHEDULER_BATCH_SIZE], self._handlers)
+            except Exception:
+                logger.exception("Appointment reminder batch failed")
+
+    def _run(self):
+        next_load = 0.0
+        while True:
+            now = time.time()
+            if now >= next_load:
+                try:
+                    self._load(now)
+                    next_load = now + WINDOW_SECONDS / 2
+                except Exception:
+                    logger.exception("Scheduler load failed")
+                    next_load = now + LOAD_RETRY_SECONDS
+
+            with self._cond:
+                if self._stopping:
+                    return
+                wait = next_load - now
+                if self._heap:
+                    wait = min(wait, self._heap[0][0] - now)
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    entry = heapq.heappop(self._heap)
+                    self._queued.discard((entry[1], entry[2]))
+                    due.append(entry)
+
+            if due:
+                self._fire(due)
+
+
+appointment_scheduler = AppointmentScheduler()
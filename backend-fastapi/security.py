@@ -1,9 +1,40 @@
+import logging
+from dataclasses import dataclass
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from auth import SECRET_KEY, ALGORITHM
+from revocation import is_revoked
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Identity:
+    """
+    The caller of one request, built from the token alone.
+    Tokens minted before the scope claims existed have has_scope_claims=False;
+    callers fall back to the user document for them until they expire.
+    """
+    user_id: str
+    role: str
+    name: str = ""
+    hospital_id: Optional[str] = None
+    wallet_address: Optional[str] = None
+    has_scope_claims: bool = False
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> "Identity":
+        return cls(
+            user_id=payload["user_id"],
+            role=payload["role"],
+            name=payload.get("name", ""),
+            hospital_id=payload.get("hospital_id"),
+            wallet_address=payload.get("wallet_address"),
+            has_scope_claims="hospital_id" in payload,
+        )
 
 
 def get_current_user(token: str = Depends(oauth2_scheme)):
@@ -16,10 +47,20 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
                 detail="Invalid token payload"
             )
 
+        # In-memory snapshot, no database round trip
+        if is_revoked(payload):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked"
+            )
+
         return payload
 
+    except HTTPException:
+        raise
+
     except JWTError as e:
-        print(f"[ERROR] JWT Error: {e}")
+        logger.info("JWT rejected: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token"
@@ -32,6 +73,10 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         )
 
 
+def current_identity(user=Depends(get_current_user)) -> Identity:
+    return Identity.from_claims(user)
+
+
 def patient_guard(user=Depends(get_current_user)):
     try:
         if user.get("role") != "PATIENT":
@@ -50,6 +95,10 @@ def doctor_guard(user=Depends(get_current_user)):
         raise HTTPException(status_code=403, detail=str(e))
 
 
+def doctor_identity(user=Depends(doctor_guard)) -> Identity:
+    return Identity.from_claims(user)
+
+
 def hospital_admin_guard(user=Depends(get_current_user)):
     try:
         if user.get("role") != "HOSPITAL_ADMIN":
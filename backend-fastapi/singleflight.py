@@ -0,0 +1,77 @@
+import os
+import time
+import threading
+
+PUBLIC_READ_FRESHNESS_SECONDS = float(os.getenv("PUBLIC_READ_FRESHNESS_SECONDS", "2"))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical reads into one.
+    The first caller for a key runs the loader, callers arriving while it runs wait
+    for it and get the same result (or exception). The result is then served for
+    `freshness` seconds, so load grows with distinct keys, not with concurrent users.
+    Results are shared, callers must not mutate them.
+    """
+
+    def __init__(self, freshness: float, max_keys: int = 10000):
+        self.freshness = freshness
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._calls = {}    # key -> _Call in flight
+        self._results = {}  # key -> (expires_at, value)
+
+    def do(self, key: str, loader):
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None and result[0] > time.monotonic():
+                return result[1]
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = loader()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.freshness > 0:
+                    self._store(key, call.value)
+            call.done.set()
+
+        return call.value
+
+    def forget(self, key: str):
+        """Drop a fresh result after a write, the next read goes to the database"""
+        with self._lock:
+            self._results.pop(key, None)
+
+    def _store(self, key: str, value):
+        if len(self._results) >= self.max_keys:
+            now = time.monotonic()
+            self._results = {k: v for k, v in self._results.items() if v[0] > now}
+            if len(self._results) >= self.max_keys:
+                self._results.clear()
+        self._results[key] = (time.monotonic() + self.freshness, value)
+
+
+# Shared by the public, unauthenticated read endpoints
+public_reads = SingleFlight(PUBLIC_READ_FRESHNESS_SECONDS)
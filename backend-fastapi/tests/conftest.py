@@ -0,0 +1,51 @@
+import os
+import sys
+
+import mongomock
+import mongomock.collection
+import pytest
+
+os.environ.setdefault("JWT_SECRET", "test-secret")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+# One in-memory Mongo for the whole session, handed out where the real client would be
+_client = mongomock.MongoClient()
+db.get_client = lambda: _client
+db.ping = lambda: True
+
+# pymongo 4.9+ passes sort= to the bulk write builder, which mongomock doesn't know yet
+for _name in ("add_replace", "add_update"):
+    _original = getattr(mongomock.collection.BulkOperationBuilder, _name)
+
+    def _without_sort(self, *args, _original=_original, **kwargs):
+        kwargs.pop("sort", None)
+        return _original(self, *args, **kwargs)
+
+    setattr(mongomock.collection.BulkOperationBuilder, _name, _without_sort)
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    yield
+    for name in _client[db.DB_NAME].list_collection_names():
+        _client[db.DB_NAME].drop_collection(name)
+
+
+@pytest.fixture
+def client():
+    # Not used as a context manager: the lifespan (scheduler, revocation sync, warm-up) stays off
+    from fastapi.testclient import TestClient
+    import main
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def auth():
+    from auth import create_access_token
+
+    def headers(user_id, role: str, **claims) -> dict:
+        token = create_access_token({"user_id": str(user_id), "role": role, "name": "test", **claims})
+        return {"Authorization": f"Bearer {token}"}
+    return headers
@@ -0,0 +1,35 @@
+import queue
+import threading
+
+import blockchain_utils
+from blockchain_utils import BlockchainClient
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def test_queued_log_waits_out_a_half_open_breaker(monkeypatch):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    monkeypatch.setattr(blockchain_utils, "chain_breaker", breaker)
+    monkeypatch.setattr(blockchain_utils, "ACCESS_LOG_RETRY_SECONDS", 0.01)
+
+    sent = []
+    attempts = []
+
+    class _Client(BlockchainClient):
+        def __init__(self):
+            self._log_queue = queue.Queue()
+
+        def _send_access_log(self, patient_address, doctor_address, resource_id):
+            attempts.append(resource_id)
+            if len(attempts) < 3:
+                # Recovery in progress: another call holds the half-open probe
+                raise CircuitOpenError("chain-rpc circuit is open")
+            sent.append(resource_id)
+
+    client = _Client()
+    client._log_queue.put(("0xpatient", "0xdoctor", "record-1"))
+    threading.Thread(target=client._drain_log_queue, daemon=True).start()
+
+    done = threading.Event()
+    threading.Thread(target=lambda: (client._log_queue.join(), done.set()), daemon=True).start()
+    assert done.wait(5)
+    assert sent == ["record-1"]
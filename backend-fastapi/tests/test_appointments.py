@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+from bson import ObjectId
+
+from db import users_col, appointments_col
+from scheduler import expire_batch
+
+
+@pytest.fixture
+def people():
+    doctor, patient = ObjectId(), ObjectId()
+    users_col.insert_many([
+        {"_id": doctor, "role": "DOCTOR", "hospitalId": "H1", "status": "APPROVED", "name": "Dr"},
+        {"_id": patient, "role": "PATIENT", "name": "Pa"},
+    ])
+    return doctor, patient
+
+
+def _request(client, auth, doctor, patient, slot: datetime):
+    r = client.post("/appointments/request",
+                    json={"doctorId": str(doctor), "hospitalId": "H1", "slot": slot.isoformat()},
+                    headers=auth(patient, "PATIENT"))
+    assert r.status_code == 200, r.text
+    return appointments_col.find_one({"patientId": patient, "doctorId": doctor}, sort=[("createdAt", -1)])["_id"]
+
+
+def _future_slot(days: int = 1) -> datetime:
+    return (datetime.now(pytz.utc) + timedelta(days=days)).replace(hour=5, minute=0, second=0, microsecond=0)
+
+
+def _status(appointment_id) -> str:
+    return appointments_col.find_one({"_id": appointment_id})["status"]
+
+
+def test_request_then_accept(client, auth, people):
+    doctor, patient = people
+    apt = _request(client, auth, doctor, patient, _future_slot())
+    assert _status(apt) == "REQUESTED"
+
+    r = client.post(f"/appointments/doctor/{apt}/accept", headers=auth(doctor, "DOCTOR"))
+    assert r.status_code == 200
+    assert _status(apt) == "ACCEPTED"
+
+
+def test_slot_clash_is_rejected(client, auth, people):
+    doctor, patient = people
+    slot = _future_slot()
+    _request(client, auth, doctor, patient, slot)
+
+    r = client.post("/appointments/request",
+                    json={"doctorId": str(doctor), "hospitalId": "H1", "slot": slot.isoformat()},
+                    headers=auth(ObjectId(), "PATIENT"))
+    assert r.status_code == 409
+
+
+def test_cancel_requested_and_accepted(client, auth, people):
+    doctor, patient = people
+    requested = _request(client, auth, doctor, patient, _future_slot(1))
+    accepted = _request(client, auth, doctor, patient, _future_slot(2))
+    client.post(f"/appointments/doctor/{accepted}/accept", headers=auth(doctor, "DOCTOR"))
+
+    for apt in (requested, accepted):
+        r = client.post(f"/appointments/{apt}/cancel", headers=auth(patient, "PATIENT"))
+        assert r.status_code == 200
+        assert _status(apt) == "CANCELLED"
+
+
+def test_cancelled_appointment_cannot_be_accepted(client, auth, people):
+    doctor, patient = people
+    apt = _request(client, auth, doctor, patient, _future_slot())
+    client.post(f"/appointments/{apt}/cancel", headers=auth(patient, "PATIENT"))
+
+    r = client.post(f"/appointments/doctor/{apt}/accept", headers=auth(doctor, "DOCTOR"))
+    assert r.status_code == 409
+    assert _status(apt) == "CANCELLED"
+
+    r = client.post(f"/appointments/{apt}/cancel", headers=auth(patient, "PATIENT"))
+    assert r.status_code == 409
+
+
+def test_accepted_appointment_cannot_be_accepted_again(client, auth, people):
+    doctor, patient = people
+    apt = _request(client, auth, doctor, patient, _future_slot())
+    client.post(f"/appointments/doctor/{apt}/accept", headers=auth(doctor, "DOCTOR"))
+
+    r = client.post(f"/appointments/doctor/{apt}/accept", headers=auth(doctor, "DOCTOR"))
+    assert r.status_code == 409
+
+
+def test_other_users_appointment_is_not_found(client, auth, people):
+    doctor, patient = people
+    apt = _request(client, auth, doctor, patient, _future_slot())
+
+    assert client.post(f"/appointments/doctor/{apt}/accept", headers=auth(ObjectId(), "DOCTOR")).status_code == 404
+    assert client.post(f"/appointments/{apt}/cancel", headers=auth(ObjectId(), "PATIENT")).status_code == 404
+    assert _status(apt) == "REQUESTED"
+
+
+def test_expiry_only_touches_started_requests(people):
+    doctor, patient = people
+    now = datetime.now(pytz.utc)
+    started, upcoming, accepted = ObjectId(), ObjectId(), ObjectId()
+    appointments_col.insert_many([
+        {"_id": started, "patientId": patient, "doctorId": doctor, "hospitalId": "H1",
+         "slot": now - timedelta(minutes=5), "status": "REQUESTED"},
+        {"_id": upcoming, "patientId": patient, "doctorId": doctor, "hospitalId": "H1",
+         "slot": now + timedelta(hours=1), "status": "REQUESTED"},
+        {"_id": accepted, "patientId": patient, "doctorId": doctor, "hospitalId": "H1",
+         "slot": now - timedelta(minutes=5), "status": "ACCEPTED"},
+    ])
+
+    assert expire_batch([started, upcoming, accepted]) == 1
+    assert [_status(a) for a in (started, upcoming, accepted)] == ["EXPIRED", "REQUESTED", "ACCEPTED"]
+    # A second attempt (another worker) changes nothing
+    assert expire_batch([started]) == 0
+
+
+def test_expired_appointment_cannot_be_accepted_or_cancelled(client, auth, people):
+    doctor, patient = people
+    apt = ObjectId()
+    appointments_col.insert_one({"_id": apt, "patientId": patient, "doctorId": doctor, "hospitalId": "H1",
+                                 "slot": datetime.now(pytz.utc) - timedelta(minutes=5), "status": "REQUESTED"})
+    expire_batch([apt])
+
+    assert client.post(f"/appointments/doctor/{apt}/accept", headers=auth(doctor, "DOCTOR")).status_code == 409
+    assert client.post(f"/appointments/{apt}/cancel", headers=auth(patient, "PATIENT")).status_code == 409
+    assert _status(apt) == "EXPIRED"
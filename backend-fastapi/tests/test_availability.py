@@ -0,0 +1,116 @@
+from datetime import datetime
+
+import pytz
+
+from availability import AvailabilityIndex, DoctorSchedule, SLOT_SECONDS, IST
+
+# Monday 2030-01-07, 09:00 IST: clinic opening and the first grid slot of the day
+OPENING = int(IST.localize(datetime(2030, 1, 7, 9)).timestamp())
+
+
+def test_is_free_on_empty_schedule():
+    assert DoctorSchedule().is_free(OPENING)
+
+
+def test_is_free_rejects_overlaps():
+    schedule = DoctorSchedule()
+    schedule.add(OPENING)
+
+    assert not schedule.is_free(OPENING)
+    # Partial overlaps on either side
+    assert not schedule.is_free(OPENING - SLOT_SECONDS + 1)
+    assert not schedule.is_free(OPENING + SLOT_SECONDS - 1)
+    # Back to back is fine
+    assert schedule.is_free(OPENING - SLOT_SECONDS)
+    assert schedule.is_free(OPENING + SLOT_SECONDS)
+
+
+def test_add_is_idempotent_and_remove_frees():
+    schedule = DoctorSchedule()
+    schedule.add(OPENING + SLOT_SECONDS)
+    schedule.add(OPENING)
+    schedule.add(OPENING)
+    assert schedule.starts == [OPENING, OPENING + SLOT_SECONDS]
+
+    schedule.remove(OPENING)
+    schedule.remove(OPENING + 5 * SLOT_SECONDS)  # not booked, no-op
+    assert schedule.starts == [OPENING + SLOT_SECONDS]
+    assert schedule.is_free(OPENING)
+
+
+def _index(bookings: dict) -> AvailabilityIndex:
+    index = AvailabilityIndex()
+    index._ensure_fresh = lambda: None  # no rebuild from Mongo
+    for doctor_id, starts in bookings.items():
+        for start in starts:
+            index.book(doctor_id, datetime.fromtimestamp(start, pytz.utc))
+    return index
+
+
+def _epochs(result):
+    return [(int(slot.timestamp()), doctor_id) for slot, doctor_id in result]
+
+
+def test_earliest_free_skips_booked_slots():
+    index = _index({"d1": [OPENING, OPENING + SLOT_SECONDS]})
+    after = datetime.fromtimestamp(OPENING, pytz.utc)
+
+    assert _epochs(index.earliest_free(["d1"], 2, after)) == [
+        (OPENING + 2 * SLOT_SECONDS, "d1"),
+        (OPENING + 3 * SLOT_SECONDS, "d1"),
+    ]
+
+
+def test_earliest_free_merges_doctors_in_time_order():
+    index = _index({"d1": [OPENING], "d2": [OPENING + SLOT_SECONDS]})
+    after = datetime.fromtimestamp(OPENING, pytz.utc)
+
+    assert _epochs(index.earliest_free(["d1", "d2"], 3, after)) == [
+        (OPENING, "d2"),
+        (OPENING + SLOT_SECONDS, "d1"),
+        (OPENING + 2 * SLOT_SECONDS, "d1"),
+    ]
+
+
+def test_earliest_free_starts_on_the_grid_within_clinic_hours():
+    index = _index({})
+    # 16:50 IST: the 17:00 close leaves no slot that day, the next one is 09:00 the day after
+    after = datetime.fromtimestamp(OPENING + 7 * 3600 + 50 * 60, pytz.utc)
+
+    assert _epochs(index.earliest_free(["d1"], 1, after)) == [(OPENING + 86400, "d1")]
+
+
+def test_release_frees_the_slot():
+    index = _index({"d1": [OPENING]})
+    index.release("d1", datetime.fromtimestamp(OPENING, pytz.utc))
+
+    result = index.earliest_free(["d1"], 1, datetime.fromtimestamp(OPENING, pytz.utc))
+    assert _epochs(result) == [(OPENING, "d1")]
+
+
+def test_earliest_free_never_returns_past_slots():
+    index = _index({})
+    result = index.earliest_free(["d1"], 1, datetime(2020, 1, 6, tzinfo=pytz.utc))
+    assert result[0][0] > datetime.now(pytz.utc)
+
+
+def test_changes_during_a_rebuild_are_kept(monkeypatch):
+    import availability
+
+    index = AvailabilityIndex()
+    index.book("d1", datetime.fromtimestamp(OPENING, pytz.utc))
+    booked_at = datetime.fromtimestamp(OPENING + SLOT_SECONDS, pytz.utc)
+
+    class _Collection:
+        def find(self, *args, **kwargs):
+            # A booking and a cancellation land while the scan is running
+            index.book("d2", booked_at)
+            index.release("d1", datetime.fromtimestamp(OPENING, pytz.utc))
+            yield {"doctorId": "d1", "slot": datetime.fromtimestamp(OPENING, pytz.utc)}
+
+    monkeypatch.setattr(availability, "appointments_col", _Collection())
+    index.rebuild()
+
+    assert index._schedules["d2"].starts == [OPENING + SLOT_SECONDS]
+    assert index._schedules["d1"].starts == []
+    assert index._changes is None
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def _breaker(**kwargs) -> CircuitBreaker:
+    states = []
+    breaker = CircuitBreaker("test", failure_threshold=kwargs.pop("failure_threshold", 3),
+                             reset_timeout=kwargs.pop("reset_timeout", 60), on_state_change=states.append)
+    breaker.states = states
+    return breaker
+
+
+def _expire(breaker: CircuitBreaker):
+    # Pretend reset_timeout has passed since the breaker opened
+    breaker._opened_at = time.monotonic() - breaker.reset_timeout
+
+
+def test_opens_after_consecutive_failures():
+    breaker = _breaker()
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.states == [CircuitBreaker.OPEN]
+    assert breaker.retry_after() > 0
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_the_failure_count():
+    breaker = _breaker()
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = _breaker(failure_threshold=1)
+    breaker.record_failure()
+    _expire(breaker)
+
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # A second caller while the probe is in flight still fails fast
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_successful_probe_closes():
+    breaker = _breaker(failure_threshold=1)
+    breaker.record_failure()
+    _expire(breaker)
+
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.retry_after() == 0
+    assert breaker.states == [CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN, CircuitBreaker.CLOSED]
+    breaker.before_call()
+
+
+def test_failed_probe_reopens():
+    breaker = _breaker(failure_threshold=5)
+    for _ in range(5):
+        breaker.record_failure()
+    _expire(breaker)
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    # The timeout starts over
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
@@ -0,0 +1,38 @@
+import time
+
+from ratelimit import InMemoryRateLimiter
+
+
+def test_burst_then_wait():
+    limiter = InMemoryRateLimiter()
+    assert [limiter.take("k", rate=1, burst=3) for _ in range(3)] == [0, 0, 0]
+
+    wait = limiter.take("k", rate=1, burst=3)
+    assert 0 < wait <= 1
+
+
+def test_tokens_refill_at_rate(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    limiter = InMemoryRateLimiter()
+    limiter.take("k", rate=0.5, burst=1)
+    assert limiter.take("k", rate=0.5, burst=1) > 0
+
+    now[0] += 2
+    assert limiter.take("k", rate=0.5, burst=1) == 0
+
+
+def test_keys_are_independent():
+    limiter = InMemoryRateLimiter()
+    limiter.take("a", rate=1, burst=1)
+    assert limiter.take("a", rate=1, burst=1) > 0
+    assert limiter.take("b", rate=1, burst=1) == 0
+
+
+def test_full_buckets_are_purged():
+    limiter = InMemoryRateLimiter(max_keys=2)
+    for key in ("a", "b"):
+        limiter.take(key, rate=1000, burst=1)
+    time.sleep(0.01)
+    limiter.take("c", rate=1000, burst=1)
+    assert set(limiter._buckets) <= {"c"}
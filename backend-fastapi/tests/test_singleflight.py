@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_load():
+    flight = SingleFlight(freshness=0)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return ["value"]
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", loader)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", loader))) for _ in range(3)]
+    for t in followers:
+        t.start()
+    release.set()
+    for t in [leader, *followers]:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 4 and all(r is results[0] for r in results)
+
+
+def test_result_is_reused_while_fresh_and_forget_drops_it():
+    flight = SingleFlight(freshness=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return len(calls)
+
+    assert flight.do("k", loader) == 1
+    assert flight.do("k", loader) == 1
+    flight.forget("k")
+    assert flight.do("k", loader) == 2
+
+
+def test_errors_are_not_cached():
+    flight = SingleFlight(freshness=60)
+
+    def failing():
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        flight.do("k", failing)
+    assert flight.do("k", lambda: "ok") == "ok"
@@ -0,0 +1,22 @@
+from bson import ObjectId
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+from db import users_col
+
+
+def test_link_wallet_revokes_every_earlier_session(client, auth):
+    doctor = ObjectId()
+    users_col.insert_one({"_id": doctor, "role": "DOCTOR", "hospitalId": "H1", "status": "APPROVED", "name": "Dr"})
+    this_session, other_session = auth(doctor, "DOCTOR"), auth(doctor, "DOCTOR")
+
+    account = Account.create()
+    signature = Account.sign_message(encode_defunct(text=f"Connect to E-Health: {doctor}"), account.key).signature.hex()
+    r = client.post("/users/link-wallet", json={"walletAddress": account.address, "signature": signature},
+                    headers=this_session)
+    assert r.status_code == 200
+    fresh = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    for headers in (this_session, other_session):
+        assert client.get("/appointments/doctor/my-appointments", headers=headers).status_code == 401
+    assert client.get("/appointments/doctor/my-appointments", headers=fresh).status_code == 200
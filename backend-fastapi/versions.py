@@ -0,0 +1,71 @@
+import os
+import time
+import hashlib
+from fastapi import Request, Response
+from pymongo import UpdateOne
+
+from db import data_versions_col
+
+# Dashboards also embed data owned by others (doctor names, wallets, hospital names)
+# that does not bump the reader's version, so ETags roll over at least this often
+ETAG_MAX_STALENESS_SECONDS = int(os.getenv("ETAG_MAX_STALENESS_SECONDS", "300"))
+
+HOSPITALS_SCOPE = "hospitals"
+
+
+def user_scope(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def hospital_scope(hospital_id) -> str:
+    return f"hospital:{hospital_id}"
+
+
+def bump(*scopes: str, session=None):
+    """Called by write routes after the write, one round trip for all scopes"""
+    if not scopes:
+        return
+    data_versions_col.bulk_write(
+        [UpdateOne({"_id": scope}, {"$inc": {"v": 1}}, upsert=True) for scope in set(scopes)],
+        ordered=False,
+        session=session
+    )
+
+
+def get_versions(*scopes: str, session=None) -> dict:
+    # Always on the primary: inside a causal session this also moves the session past
+    # every acknowledged write, so later secondary reads of the session see them
+    found = {doc["_id"]: doc["v"] for doc in data_versions_col.find({"_id": {"$in": list(scopes)}}, session=session)}
+    return {scope: found.get(scope, 0) for scope in scopes}
+
+
+def make_etag(request: Request, scopes: tuple, session=None, versions: dict = None) -> str:
+    if versions is None:
+        versions = get_versions(*scopes, session=session)
+    window = int(time.time() // ETAG_MAX_STALENESS_SECONDS)
+    # Path and query are part of the tag: ?include_archive=true is a different representation
+    raw = "|".join([request.url.path, str(sorted(request.query_params.multi_items())), str(window)]
+                   + [f"{scope}={versions[scope]}" for scope in scopes])
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+
+def conditional_get(request: Request, response: Response, *scopes: str, private: bool = True, session=None,
+                    versions: dict = None):
+    """
+    ETag handling for a GET whose data is covered by the given version scopes.
+    Returns a 304 response when the client's copy is current (the caller returns it as is),
+    otherwise sets ETag on `response` and returns None so the caller loads the data.
+    The version lookup happens before the data is read, so a concurrent write can only
+    make the tag older than the data, never newer. Data served from a cache must be
+    keyed by the same versions: pass them in (`versions`) and to cache.cached().
+    """
+    etag = make_etag(request, scopes, session, versions)
+    cache_control = "private, no-cache" if private else "no-cache"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return None
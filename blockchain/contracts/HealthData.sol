@@ -43,6 +43,15 @@ contract HealthData {
         return accessList[patient][doctor];
     }
 
+    // Check a doctor's access to several patients in a single call
+    function checkAccessBatch(address[] memory patients, address doctor) public view returns (bool[] memory) {
+        bool[] memory result = new bool[](patients.length);
+        for (uint256 i = 0; i < patients.length; i++) {
+            result[i] = accessList[patients[i]][doctor];
+        }
+        return result;
+    }
+
     // Log data access - Only callable by the Backend Server (Owner)
     // The backend verifies the checkAccess logic via view call first, 
     // then calls this to write the log to the blockchain.
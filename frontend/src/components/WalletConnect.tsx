@@ -28,13 +28,17 @@ export default function WalletConnect() {
 
             // 2. Send to Backend
             const token = localStorage.getItem('token');
-            await axios.post('http://127.0.0.1:8000/users/link-wallet', {
+            const response = await axios.post('http://127.0.0.1:8000/users/link-wallet', {
                 walletAddress,
                 signature
             }, {
                 headers: { Authorization: `Bearer ${token}` }
             });
 
+            // The old token still carries the previous wallet claim
+            localStorage.setItem('token', response.data.access_token);
+            axios.defaults.headers.common['Authorization'] = `Bearer ${response.data.access_token}`;
+
             setLinkedAddress(walletAddress);
             toast.success("Wallet Linked Successfully!");
 
@@ -159,11 +159,16 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
       const signature = await signer.signMessage(message);
 
       // Send to Backend
-      await axios.post("http://127.0.0.1:8000/users/link-wallet", {
+      const response = await axios.post("http://127.0.0.1:8000/users/link-wallet", {
         walletAddress: address,
         signature: signature
       });
 
+      // The old token still carries the previous wallet claim
+      const token = response.data.access_token;
+      localStorage.setItem("token", token);
+      axios.defaults.headers.common["Authorization"] = `Bearer ${token}`;
+
       // Update State
       setUser({ ...user, walletAddress: address });
       alert("Wallet Linked Successfully!");
@@ -178,6 +183,8 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
   /* -------- LOGOUT -------- */
 
   const logout = () => {
+    // Best effort: the server rejects this token from now on
+    axios.post("http://127.0.0.1:8000/users/logout").catch(() => {});
     localStorage.removeItem("token");
     delete axios.defaults.headers.common["Authorization"];
     setUser(null);
@@ -25,7 +25,7 @@ interface Appointment {
   patientName: string;
   patientEmail: string;
   slot: string;
-  status: 'REQUESTED' | 'ACCEPTED' | 'COMPLETED' | 'CANCELLED';
+  status: 'REQUESTED' | 'ACCEPTED' | 'COMPLETED' | 'CANCELLED' | 'EXPIRED';
 }
 
 interface Medicine {
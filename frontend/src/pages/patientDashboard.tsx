@@ -29,7 +29,7 @@ interface Appointment {
   doctorId: string;
   hospitalId: string;
   slot: string;
-  status: 'REQUESTED' | 'ACCEPTED' | 'COMPLETED' | 'CANCELLED';
+  status: 'REQUESTED' | 'ACCEPTED' | 'COMPLETED' | 'CANCELLED' | 'EXPIRED';
   doctorName: string;
   specialization: string;
   hospitalName: string;